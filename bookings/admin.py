@@ -2,8 +2,9 @@ from django.contrib import admin
 from django.contrib import messages
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.admin.models import LogEntry, CHANGE
+from django.utils import timezone
 
-from .models import Booking, CancelledBooking
+from .models import Booking, CancelledBooking, ArchivedBooking
 
 
 @admin.register(Booking)
@@ -15,9 +16,16 @@ class BookingAdmin(admin.ModelAdmin):
     def get_content_type_id(self):
         return ContentType.objects.get_for_model(Booking).pk
 
+    def approval_changed(self, request, queryset):
+        '''
+        Hook called after approval fields of bookings in queryset are changed
+        '''
+        pass
+
     def approve_and_protect(self, request, queryset):
         try:
-            changed = queryset.update(approval_status=Booking.APPROVAL_STATUS_APPROVED, approval_protected=True)
+            changed = queryset.update(approval_status=Booking.APPROVAL_STATUS_APPROVED, approval_protected=True, updated_at=timezone.now())
+            self.approval_changed(request, queryset)
             for b in queryset:
                 LogEntry.objects.log_action(
                                     user_id=request.user.id,
@@ -34,7 +42,8 @@ class BookingAdmin(admin.ModelAdmin):
 
     def decline_and_protect(self, request, queryset):
         try:
-            changed = queryset.update(approval_status=Booking.APPROVAL_STATUS_DECLINED, approval_protected=True)
+            changed = queryset.update(approval_status=Booking.APPROVAL_STATUS_DECLINED, approval_protected=True, updated_at=timezone.now())
+            self.approval_changed(request, queryset)
             for b in queryset:
                 LogEntry.objects.log_action(
                                     user_id=request.user.id,
@@ -51,7 +60,8 @@ class BookingAdmin(admin.ModelAdmin):
 
     def reset_approval(self, request, queryset):
         try:
-            changed = queryset.update(approval_status=Booking.APPROVAL_STATUS_NEW, approval_protected=False)
+            changed = queryset.update(approval_status=Booking.APPROVAL_STATUS_NEW, approval_protected=False, updated_at=timezone.now())
+            self.approval_changed(request, queryset)
             for b in queryset:
                 LogEntry.objects.log_action(
                                     user_id=request.user.id,
@@ -85,3 +95,16 @@ class CancelledBookingAdmin(admin.ModelAdmin):
         if 'cancelled_at' in readonly_fields:
             readonly_fields.remove('cancelled_at')
         return readonly_fields
+
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(admin.ModelAdmin):
+    list_display = ('email', 'event_type_id', 'spot_start', 'booked_at', 'approval_status', 'archived_at')
+    list_filter = ('event_type_id', 'approval_status')
+    search_fields = ('email',)
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-19 17:46
+
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def normalize_emails(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    Booking.objects.update(email_normalized=Lower(Trim('email')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='email_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.28 on 2026-10-19 17:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_booking_email_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('event_type_id', models.CharField(db_index=True, default='', max_length=32)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('email_normalized', models.CharField(blank=True, max_length=254)),
+                ('spot_start', models.DateTimeField()),
+                ('spot_end', models.DateTimeField()),
+                ('booked_at', models.DateTimeField()),
+                ('approval_status', models.CharField(choices=[('NEW', 'New'), ('APPROVED', 'Approved'), ('DECLINED', 'Declined')], max_length=16)),
+                ('approval_protected', models.BooleanField(default=False)),
+                ('cancelled_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -3,6 +3,13 @@ from django.utils import timezone
 from django.utils.translation import ugettext as translate
 
 
+def normalize_email(email):
+    """
+    Key used to match emails typed with different case or stray spaces
+    """
+    return (email or '').strip().lower()
+
+
 class BookingSoftDeletionManager(models.Manager):
     def __init__(self, *args, **kwargs):
         self.active_only = kwargs.pop('active_only', True)
@@ -37,6 +44,7 @@ class Booking(models.Model):
 
     event_type_id = models.CharField(max_length=32, default='', db_index=True)
     email = models.EmailField(null=False, blank=True)
+    email_normalized = models.CharField(max_length=254, blank=True, db_index=True, editable=False)
     spot_start = models.DateTimeField()
     spot_end = models.DateTimeField()
     booked_at = models.DateTimeField(default=timezone.now)
@@ -76,6 +84,28 @@ class Booking(models.Model):
     class Meta:
         ordering = ["-created_at"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Booking, cls).from_db(db, field_names, values)
+        instance._stored = instance.get_stored()
+        return instance
+
+    def get_stored(self):
+        """
+        Event type and status the booking is counted under, receivers of
+        post_save compare them with _stored, as loaded, to tell what changed
+        @return (event_type_id, approval_status, cancelled), None when any
+        of them is deferred
+        """
+        if any(name not in self.__dict__ for name in ('event_type_id', 'approval_status', 'cancelled_at')):
+            return None
+        return (self.event_type_id, self.approval_status, self.cancelled_at is not None)
+
+    def save(self, *args, **kwargs):
+        self.email_normalized = normalize_email(self.email)
+        super(Booking, self).save(*args, **kwargs)
+        self._stored = self.get_stored()
+
     def delete(self):
         self.cancelled_at = timezone.now()
         self.save()
@@ -96,3 +126,29 @@ class CancelledBooking(Booking):
 
     def delete(self):
         super(CancelledBooking, self).hard_delete()
+
+
+class ArchivedBooking(models.Model):
+    """
+    Bookings of finished event types, moved out of Booking so queries on
+    current ones only go over a small table. Ids are kept for restoring
+    """
+    id = models.IntegerField(primary_key=True)
+    event_type_id = models.CharField(max_length=32, default='', db_index=True)
+    email = models.EmailField(blank=True)
+    email_normalized = models.CharField(max_length=254, blank=True)
+    spot_start = models.DateTimeField()
+    spot_end = models.DateTimeField()
+    booked_at = models.DateTimeField()
+    approval_status = models.CharField(max_length=16, choices=Booking.APPROVAL_STATUS_CHOICES)
+    approval_protected = models.BooleanField(default=False)
+    cancelled_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return 'Archived booking #'+str(self.id)
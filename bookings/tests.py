@@ -91,6 +91,12 @@ class BookingTests(TestCase):
     def test_cancelled_is_proxy(self):
         self.assertEqual(CancelledBooking._meta.proxy, True)
 
+    def test_email_normalized(self):
+        b = Booking.objects.first()
+        b.email = " Someone@LocalHost "
+        b.save()
+        self.assertEqual(Booking.objects.get(email_normalized="someone@localhost"), b)
+
 class BookingAdminTests(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -53,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'webhook_calendly.replica.ReplicaStalenessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -90,6 +91,12 @@ DATABASES = {
 }
 
 
+# Bulk approval updates, first-booked and rank lookups use PostgreSQL syntax
+# there, portable ORM queries elsewhere; False uses the latter everywhere
+
+DATABASE_FAST_PATHS = True
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -132,6 +139,48 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
 
+# Report fragments are keyed on a digest of each group, so they can live long
+
+REPORT_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Clients further behind than this many changed groups reload the whole report
+
+REPORT_CHANGES_MAX_GROUPS = 50
+
+# trim_report_changes keeps this many hours of report changes, pages left
+# open longer reload instead of catching up
+
+REPORT_CHANGES_RETENTION_HOURS = 24
+
+# Report data served by the JSON API is cached per report version, this bounds
+# staleness for edits that do not go through the approval pipeline
+
+REPORT_SNAPSHOT_CACHE_TIMEOUT = 60
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 500
+
+# run_jobs marks jobs running longer than this failed, as left by a worker that
+# stopped; keep it above the longest job
+
+JOB_RUNNING_TIMEOUT = 60 * 60
+
+# Calendly API calls hold a worker thread while waiting, so never wait forever
+
+CALENDLY_API_TIMEOUT = 10
+
+# Calendly payloads are only read back in the admin, so keep them compressed;
+# after this many days past its spot, compact_payloads trims a payload to the
+# fields bookings are made of (None keeps them whole)
+
+CALENDLY_PAYLOAD_COMPRESSION = True
+CALENDLY_PAYLOAD_RETENTION_DAYS = None
+
+# Base URL Calendly posts webhooks to, when a separate app serves them with
+# settings_webhook (empty uses the URL the admin is browsed at)
+
+WEBHOOK_BASE_URL = os.environ.get('WEBHOOK_BASE_URL', '')
+
 # Login Service
 
 LOGIN_URL = '/admin/login/'
@@ -159,7 +208,9 @@ CONSTANCE_CONFIG = {
     'APPROVAL_USER_ID': (1, 'Approval System User ID (for logging purpose)', int),
     'APPROVAL_NO_GROUP_ACTION': ('DECLINE', '', 'APPROVAL_TYPE_CHOICES'),
     'DEFAULT_EVENT_TYPE_ID': ('', 'Default event_type_id (leave blank for the latest one with booking spots)', str),
-    'SHOW_DECLINED_COUNT_FRONTEND': (True, '', bool)
+    'SHOW_DECLINED_COUNT_FRONTEND': (True, '', bool),
+    'REPORT_POLL_INTERVAL': (15, 'Seconds between live update checks on student report (0 to disable)', int),
+    'APPROVAL_DEBOUNCE_SECONDS': (0, 'Seconds to collect bookings of a group before approving them in one run (0 approves on every webhook; otherwise needs the process_approvals worker)', int),
 }
 
 # import-export
@@ -169,6 +220,45 @@ IMPORT_EXPORT_IMPORT_PERMISSION_CODE = 'add'
 import django_heroku
 django_heroku.settings(locals())
 
+# Read replica (e.g. a Heroku follower) for reports, JSON API and exports,
+# from DATABASE_REPLICA_URL; sessions that wrote read the primary for
+# REPLICA_STALENESS_SECONDS after, to see their own changes
+
+if 'DATABASE_REPLICA_URL' in os.environ:
+    import dj_database_url
+    DATABASES['replica'] = dj_database_url.parse(os.environ['DATABASE_REPLICA_URL'], ssl_require=True)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['webhook_calendly.replica.ReplicaRouter']
+REPLICA_STALENESS_SECONDS = int(os.environ.get('REPLICA_STALENESS_SECONDS', 30))
+
+# Database connections, from config vars:
+# - DATABASE_CONN_MAX_AGE: seconds a connection is reused (0 reconnects for
+#   every request), keep it below the server's idle timeout
+# - DATABASE_STATEMENT_TIMEOUT: milliseconds before PostgreSQL cancels a
+#   statement (0 never), so a runaway query frees its worker thread
+# - DATABASE_POOL_MODE: "transaction" when DATABASE_URL points to PgBouncer
+#   in transaction pooling mode, which can neither keep server-side cursors
+#   nor pass startup options (set statement_timeout on the role instead)
+
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 600))
+DATABASE_STATEMENT_TIMEOUT = int(os.environ.get('DATABASE_STATEMENT_TIMEOUT', 0))
+DATABASE_POOL_MODE = os.environ.get('DATABASE_POOL_MODE', 'session')
+
+for db in DATABASES.values():
+    db['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
+    if 'postgresql' not in db['ENGINE']:
+        continue
+    if DATABASE_POOL_MODE == 'transaction':
+        db['DISABLE_SERVER_SIDE_CURSORS'] = True
+    elif DATABASE_STATEMENT_TIMEOUT:
+        db.setdefault('OPTIONS', {})['options'] = '-c statement_timeout={}'.format(DATABASE_STATEMENT_TIMEOUT)
+
+# WhiteNoise, set up by django_heroku, serves static files hashed and
+# pre-compressed, hashed names are cached forever as immutable, everything
+# else (e.g. favicon.ico) for a day
+WHITENOISE_MAX_AGE = 60 * 60 * 24
+
 if 'DYNO' in os.environ:
     TEST_RUNNER = 'django_heroku.HerokuDiscoverRunner'
     DEBUG = False
@@ -0,0 +1,27 @@
+"""
+Slim settings for a process serving only the Calendly webhook.
+
+Same database and config as calendly_helper.settings, without the admin,
+import-export (which loads every spreadsheet library it can export to),
+sessions and static files, so workers start faster and stay smaller.
+Use with DJANGO_SETTINGS_MODULE=calendly_helper.settings_webhook.
+"""
+from .settings import *  # noqa
+
+INSTALLED_APPS = [
+    'bookings.apps.BookingsConfig',
+    'webhook_calendly.apps.WebhookCalendlyConfig',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'constance',
+    'constance.backends.database',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'calendly_helper.urls_webhook'
+
+TEMPLATES = [dict(TEMPLATES[0], OPTIONS={'context_processors': []})]
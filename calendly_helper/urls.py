@@ -24,6 +24,7 @@ urlpatterns = [
     path('', include('webhook_calendly.frontend_urls')),
     path('', include('bookings.urls')),
     path('calendly/', include('webhook_calendly.urls')),
+    path('api/v1/', include('webhook_calendly.api_urls')),
     path('admin/', admin.site.urls),
     path('favicon.ico', RedirectView.as_view(url=static('favicon.ico'), permanent=True))
 ]
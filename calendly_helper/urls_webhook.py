@@ -0,0 +1,11 @@
+"""calendly_helper URL Configuration for settings_webhook
+
+Only the webhook, at the same URL as in the full site.
+"""
+from django.urls import path
+
+from webhook_calendly.views.hook import webhook_post
+
+urlpatterns = [
+    path('calendly/post', webhook_post, name='webhook_post'),
+]
@@ -0,0 +1,26 @@
+"""
+Gunicorn config for calendly_helper.
+
+Most slow requests (webhook approvals, Calendly hook management) spend
+their time waiting on the database or Calendly, so threaded workers keep
+serving other requests meanwhile instead of blocking a whole process.
+
+Tune with WEB_CONCURRENCY (processes) and GUNICORN_THREADS (threads per
+process); each thread may hold its own persistent database connection.
+
+The app is loaded once before forking (GUNICORN_PRELOAD=0 to turn off), so
+workers start right away and share the memory of imported modules.
+"""
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def pre_fork(server, worker):
+    # a connection the preloaded app opened must not be shared by workers
+    from django.db import connections
+    connections.close_all()
@@ -1,13 +1,18 @@
 from django.contrib import admin
 from django.utils.translation import ugettext_lazy as _
-from django.http import HttpResponseRedirect
-from django.urls import reverse
+from django.http import HttpResponse, HttpResponseRedirect
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.core import signing
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.urls import reverse, path
+from django.utils.html import format_html
 from django.apps import apps
-from django.db.models import Count, Subquery, OuterRef
-from django.db.models.fields import IntegerField
+from django.db.models import Count, Q
 from django.contrib import messages
-from .models import ApprovalGroup, Invitee, BookingCalendlyData
-from bookings.models import Booking, CancelledBooking
+from .models import ApprovalGroup, Invitee, BookingCalendlyData, ReportChange, Job, ApprovalEvent, EventType
+from bookings.models import Booking, CancelledBooking, normalize_email
 
 from import_export import fields, resources
 from import_export.widgets import ForeignKeyWidget
@@ -16,6 +21,29 @@ from bookings.admin import BookingAdmin, CancelledBookingAdmin
 
 from .admin_decorators import admin_link
 from .views.frontend import get_default_event_type_id
+from collections import Counter
+import uuid
+
+
+APPROVAL_DIFF_SALT = 'webhook_calendly.approval_diff'
+
+
+def message_job_queued(model_admin, request, job):
+    model_admin.message_user(request, format_html(
+        'Queued <a href="{}">{}</a>, it runs in the background.',
+        reverse('admin:webhook_calendly_job_change', args=(job.pk,)), job))
+
+
+class BackgroundExportMixin(object):
+    def export_in_background(self, request, queryset):
+        resource = self.get_export_resource_class()
+        job = Job.objects.enqueue('export', request.user,
+            resource=resource.__module__+'.'+resource.__qualname__,
+            model=self.model._meta.label,
+            pks=list(queryset.values_list('pk', flat=True)))
+        message_job_queued(self, request, job)
+    export_in_background.short_description = "Export selected in background"
+    export_in_background.allowed_permissions = ('view',)
 
 
 class GroupCreationWidget(ForeignKeyWidget):
@@ -37,6 +65,20 @@ class InviteeIEResource(resources.ModelResource):
         export_order = ('email', 'group', )
         import_id_fields = ('email', )
 
+    def get_instance(self, instance_loader, row):
+        # the same address in another case updates the invitee there is
+        return Invitee.objects.filter(email_normalized=normalize_email(row.get('email'))).first()
+
+    def import_data_inner(self, *args, **kwargs):
+        # a single report change for the whole file
+        with ReportChange.objects.collect():
+            return super(InviteeIEResource, self).import_data_inner(*args, **kwargs)
+
+    def after_import(self, *args, **kwargs):
+        # still within the transaction, which a dry run rolls back
+        ReportChange.objects.flush()
+        return super(InviteeIEResource, self).after_import(*args, **kwargs)
+
 
 class InviteeInline(admin.TabularInline):
     model = Invitee
@@ -60,8 +102,7 @@ class GroupAdmin(admin.ModelAdmin):
         try:
             changed = []
             for group in queryset:
-                approved, declined = group.get_approval_executor(event_type_id)
-                changed = changed + group.execute_approval(approved, declined)
+                changed = changed + group.run_approval(event_type_id)
             self.message_user(request, "Updated "+str(len(changed))+" approval in "+event_type_id+".")
         except Exception as e:
             self.message_user(request, str(e), messages.ERROR)
@@ -74,21 +115,74 @@ class GroupAdmin(admin.ModelAdmin):
             self.message_user(request, 'There is no default event_type_id', messages.ERROR)
             return
 
+        if 'apply' in request.POST and not self.has_change_permission(request):
+            raise PermissionDenied
+
+        signed = request.POST.get('diff')
         try:
-            changed = []
-            for group in queryset:
-                approved, declined = group.get_approval_executor(event_type_id)
-                changed = changed + group.execute_approval(approved, declined, fake=True)
-            msg = "Previewing "+str(len(changed))+" approval in "+event_type_id+":\n"
-            for b in changed:
-                msg = msg + str(b.id) + " changed to " + b.approval_status + "\n"
-            self.message_user(request, msg)
+            if signed:
+                preview = signing.loads(signed, salt=APPROVAL_DIFF_SALT)
+                event_type_id, diff = preview['event_type_id'], preview['diff']
+            else:
+                diff = ApprovalGroup.objects.approval_diff(event_type_id, queryset)
+                signed = signing.dumps({'event_type_id': event_type_id, 'diff': diff},
+                    salt=APPROVAL_DIFF_SALT, compress=True)
+
+            if 'apply' in request.POST:
+                changed = ApprovalGroup.objects.apply_approval_diff(event_type_id, diff)
+                skipped = len(diff) - len(changed)
+                self.message_user(request, "Updated "+str(len(changed))+" approval in "+event_type_id+"."
+                    + (" Skipped "+str(skipped)+" changed since the preview." if skipped else ""))
+                return
+        except signing.BadSignature:
+            self.message_user(request, 'The preview was altered, please preview again', messages.ERROR)
+            return
         except Exception as e:
             self.message_user(request, str(e), messages.ERROR)
+            return
+
+        group_names = dict(ApprovalGroup.objects.filter(
+            pk__in={group_id for _, group_id, _, _ in diff}).values_list('pk', 'name'))
+        transitions = Counter((current, status) for _, _, current, status in diff)
+        groups = Counter(group_id for _, group_id, _, _ in diff)
+
+        page = Paginator(diff, self.list_per_page).get_page(request.POST.get('page'))
+        bookings = Booking.all_objects.in_bulk([pk for pk, _, _, _ in page])
+
+        context = dict(
+            self.admin_site.each_context(request),
+            title="Preview Default Approval",
+            opts=self.model._meta,
+            event_type_id=event_type_id,
+            selected=request.POST.getlist(admin.ACTION_CHECKBOX_NAME),
+            signed_diff=signed,
+            changes_count=len(diff),
+            transitions=sorted(transitions.items()),
+            can_apply=self.has_change_permission(request),
+            groups=sorted(((group_names.get(group_id), count) for group_id, count in groups.items()),
+                key=lambda g: str(g[0])),
+            page=page,
+            rows=[(bookings.get(pk), group_names.get(group_id), current, status)
+                for pk, group_id, current, status in page],
+        )
+        return TemplateResponse(request, "admin/webhook_calendly/approvalgroup/preview_approval.html", context)
     preview_approval.short_description = "Preview Default Approval"
     preview_approval.allowed_permissions = ('view',)
 
-    actions = [execute_approval, preview_approval]
+    def execute_approval_in_background(self, request, queryset):
+        event_type_id = get_default_event_type_id()
+        if not event_type_id:
+            self.message_user(request, 'There is no default event_type_id', messages.ERROR)
+            return
+
+        job = Job.objects.enqueue('execute_approval', request.user,
+            group_ids=list(queryset.values_list('pk', flat=True)),
+            event_type_id=event_type_id)
+        message_job_queued(self, request, job)
+    execute_approval_in_background.short_description = "Execute Default Approval in background"
+    execute_approval_in_background.allowed_permissions = ('change',)
+
+    actions = [execute_approval, preview_approval, execute_approval_in_background]
 
     def invitees_count(self, inst):
         return inst._invitees_count
@@ -109,8 +203,9 @@ class GroupAdmin(admin.ModelAdmin):
         )
 
 
-class InviteeAdmin(ImportExportModelAdmin):
+class InviteeAdmin(BackgroundExportMixin, ImportExportModelAdmin):
     resource_class = InviteeIEResource
+    actions = ['export_in_background']
     list_display = ('email', 'group_link', 'bookings_total')
     list_select_related = ('group',)
 
@@ -124,13 +219,8 @@ class InviteeAdmin(ImportExportModelAdmin):
 
     def get_queryset(self, request):
         qs = super(InviteeAdmin, self).get_queryset(request)
-        booking_qs = Booking.objects.filter(
-                email=OuterRef('email')
-            ).values('email').order_by('email').annotate(
-                total=Count('email')
-            ).values('total')
         return qs.annotate(
-            _bookings_total=Subquery(booking_qs[:1], output_field=IntegerField())
+            _bookings_total=Count('bookingcalendlydata', filter=Q(bookingcalendlydata__booking__cancelled_at=None))
         )
 
 
@@ -177,6 +267,7 @@ class Hook(object):
 
 class BookingCalendlyInline(admin.StackedInline):
     model = BookingCalendlyData
+    readonly_fields = ('invitee',)
     # extra = 0
     show_change_link = True
 
@@ -199,16 +290,169 @@ class BookingCalendlyIEResource(resources.ModelResource):
             'approval_status', 'approval_protected',
             'calendly_data__calendly_uuid', 'calendly_data__approval_group__name')
 
+    def export(self, queryset=None, *args, **kwargs):
+        # a single query, without the payloads
+        if queryset is not None:
+            queryset = queryset.select_related('calendly_data__approval_group').defer(
+                'calendly_data__payload', 'calendly_data__payload_zlib')
+        return super(BookingCalendlyIEResource, self).export(queryset, *args, **kwargs)
 
-class BookingCalendlyAdmin(ImportExportMixin, BookingAdmin):
+
+class BookingCalendlyAdmin(BackgroundExportMixin, ImportExportMixin, BookingAdmin):
     inlines = [BookingCalendlyInline]
     resource_class = BookingCalendlyIEResource
+    actions = BookingAdmin.actions + ['calendly_cancel_in_background', 'export_in_background']
+
+    def calendly_cancel_in_background(self, request, queryset):
+        job = Job.objects.enqueue('calendly_cancel', request.user,
+            booking_ids=list(queryset.values_list('pk', flat=True)))
+        message_job_queued(self, request, job)
+    calendly_cancel_in_background.short_description = "Cancel on Calendly in background"
+    calendly_cancel_in_background.allowed_permissions = ('change',)
+
+    def approval_changed(self, request, queryset):
+        changes = BookingCalendlyData.objects.filter(
+            booking__in=queryset
+        ).values_list('booking__event_type_id', 'approval_group').distinct()
+        for event_type_id, group_id in changes:
+            ReportChange.objects.record(event_type_id, [group_id])
+        # actions update in bulk, sending no signals to move the counts
+        for event_type_id in set(event_type_id for event_type_id, group_id in changes):
+            EventType.objects.refresh(event_type_id)
+
+    def save_related(self, request, form, formsets, change):
+        super(BookingCalendlyAdmin, self).save_related(request, form, formsets, change)
+        if 'email' in form.changed_data:
+            for calendly_data in BookingCalendlyData.objects.filter(booking=form.instance):
+                calendly_data.link_invitee()
+                calendly_data.save()
+        self.approval_changed(request, Booking.all_objects.filter(pk=form.instance.pk))
+
+    def delete_queryset(self, request, queryset):
+        # by id, as cancelled bookings are out of the queryset once deleted
+        deleted = Booking.all_objects.filter(pk__in=list(queryset.values_list('pk', flat=True)))
+        super(BookingCalendlyAdmin, self).delete_queryset(request, queryset)
+        self.approval_changed(request, deleted)
 
 
 class CancelledBookingCalendlyAdmin(CancelledBookingAdmin):
     inlines = [CancelledBookingCalendlyInline]
 
 
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'progress_display', 'user', 'created_at', 'finished_at', 'download_link')
+    list_filter = ('status', 'name')
+    exclude = ('output',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def progress_display(self, obj):
+        if not obj.total:
+            return '-'
+        return '{} / {} ({}%)'.format(obj.progress, obj.total, obj.progress * 100 // obj.total)
+    progress_display.short_description = 'Progress'
+
+    def download_link(self, obj):
+        if not obj.output_name:
+            return '-'
+        return format_html('<a href="{}">{}</a>',
+            reverse('admin:webhook_calendly_job_download', args=(obj.pk,)), obj.output_name)
+    download_link.short_description = 'Output'
+
+    def get_readonly_fields(self, request, obj=None):
+        return [field.name for field in self.model._meta.fields if field.name != 'output'] + ['download_link']
+
+    def get_queryset(self, request):
+        qs = super(JobAdmin, self).get_queryset(request)
+        return qs.defer('output').select_related('user')
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view),
+                name='webhook_calendly_job_download'),
+        ] + super(JobAdmin, self).get_urls()
+
+    def has_download_permission(self, request, job):
+        """
+        Outputs are rows of the exported model, only for people who may view
+        those in the admin
+        """
+        if not self.has_view_permission(request, job):
+            return False
+        try:
+            model = apps.get_model(job.kwargs['model'])
+        except (KeyError, LookupError):
+            return request.user.is_superuser
+        model_admin = self.admin_site._registry.get(model)
+        if model_admin is None:
+            return request.user.is_superuser
+        return model_admin.has_view_permission(request)
+
+    def download_view(self, request, pk):
+        job = get_object_or_404(Job, pk=pk)
+        if not self.has_download_permission(request, job):
+            raise PermissionDenied
+        response = HttpResponse(job.output, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(job.output_name)
+        return response
+
+
+class ApprovalEventAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'booking_link', 'group_link', 'old_status', 'new_status', 'run_id')
+    list_filter = ('new_status', 'created_at')
+    list_select_related = ('booking', 'group')
+    search_fields = ('=run_id', '=booking__id')
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+
+    @admin_link('booking', _('Booking'))
+    def booking_link(self, booking):
+        return booking
+
+    @admin_link('group', _('Group'))
+    def group_link(self, group):
+        return group
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_search_results(self, request, queryset, search_term):
+        # a run id or a booking id, other terms match nothing rather than
+        # comparing them with the wrong column type
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        try:
+            return queryset.filter(run_id=uuid.UUID(search_term)), False
+        except ValueError:
+            pass
+        if search_term.isdigit():
+            return queryset.filter(booking_id=int(search_term)), False
+        return queryset.none(), False
+
+
+class EventTypeAdmin(admin.ModelAdmin):
+    list_display = ('event_type_id', 'name', 'new_count', 'approved_count', 'declined_count',
+        'cancelled_count', 'first_spot', 'last_spot')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+
 admin.site.unregister(Booking)
 admin.site.register(Booking, BookingCalendlyAdmin)
 admin.site.unregister(CancelledBooking)
@@ -217,3 +461,6 @@ admin.site.register(CancelledBooking, CancelledBookingCalendlyAdmin)
 admin.site.register((Hook,), HookAdmin)
 admin.site.register(ApprovalGroup, GroupAdmin)
 admin.site.register(Invitee, InviteeAdmin)
+admin.site.register(Job, JobAdmin)
+admin.site.register(ApprovalEvent, ApprovalEventAdmin)
+admin.site.register(EventType, EventTypeAdmin)
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import api
+
+urlpatterns = [
+    path('groups/', api.groups, name='api_groups'),
+    path('bookings/', api.bookings, name='api_bookings'),
+]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WebhookCalendlyConfig(AppConfig):
     name = 'webhook_calendly'
     verbose_name = 'Calendly'
+
+    def ready(self):
+        from . import signals
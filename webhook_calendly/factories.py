@@ -0,0 +1,171 @@
+"""
+Synthetic groups, invitees and Calendly bookings for performance testing,
+written with bulk inserts. Rows are made the way the webhook and imports
+make them (normalized emails, linked invitees, compressed payloads), but
+without any approval run
+"""
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from datetime import timedelta
+import random
+
+from bookings.models import Booking, normalize_email
+from .models import ApprovalGroup, Invitee, BookingCalendlyData, ReportChange, EventType
+
+APPROVAL_TYPE_WEIGHTS = (
+    (ApprovalGroup.APPROVAL_TYPE_FIRST_BOOKED, 90),
+    (ApprovalGroup.APPROVAL_TYPE_DECLINE, 5),
+    (ApprovalGroup.APPROVAL_TYPE_MANUAL, 5),
+)
+
+
+def bulk_create(model, objs, batch_size=1000):
+    """
+    bulk_create, with primary keys set on every backend: PostgreSQL returns
+    them, others get rows numbered after the highest one, as bookings have
+    no other unique field to fetch them back by
+    """
+    with transaction.atomic():
+        if not connection.features.can_return_ids_from_bulk_insert:
+            last = model._base_manager.aggregate(last=Max('pk'))['last'] or 0
+            for pk, obj in enumerate(objs, last + 1):
+                obj.pk = pk
+        return model._base_manager.bulk_create(objs, batch_size=batch_size)
+
+
+def make_groups(rng, prefix, count, batch_size=1000):
+    types, weights = zip(*APPROVAL_TYPE_WEIGHTS)
+    return bulk_create(ApprovalGroup, [
+        ApprovalGroup(name='{} {:05d}'.format(prefix, i), approval_type=rng.choices(types, weights)[0])
+        for i in range(count)
+    ], batch_size=batch_size)
+
+
+def make_invitees(rng, prefix, groups, per_group, batch_size=1000):
+    invitees = []
+    for group in groups:
+        for _ in range(per_group):
+            email = '{}.{:06d}@Example.edu'.format(prefix, len(invitees))
+            # mixed case, as typed into Calendly and spreadsheets
+            if rng.random() < 0.5:
+                email = email.lower()
+            invitees.append(Invitee(email=email, email_normalized=normalize_email(email), group=group))
+    return bulk_create(Invitee, invitees, batch_size=batch_size)
+
+
+def make_payload(rng, event_type, invitee_uuid, email, spot_start, spot_end, booked_at, cancelled_at):
+    return {
+        'event_type': {'uuid': event_type[0], 'name': event_type[1], 'kind': 'One-on-One', 'duration': 15},
+        'event': {
+            'uuid': '%016X' % rng.getrandbits(64),
+            'invitee_start_time': spot_start.isoformat(),
+            'invitee_end_time': spot_end.isoformat(),
+            'location': 'Room {}'.format(rng.randint(100, 999)),
+            'canceled': cancelled_at is not None,
+        },
+        'invitee': {
+            'uuid': invitee_uuid,
+            'email': email,
+            'name': email.split('@')[0],
+            'timezone': 'America/New_York',
+            'created_at': booked_at.isoformat(),
+            'canceled': cancelled_at is not None,
+            'canceled_at': cancelled_at.isoformat() if cancelled_at else None,
+        },
+        'questions_and_answers': [
+            {'question': 'Anything we should know?', 'answer': 'x' * rng.randint(0, 200)},
+        ],
+        'tracking': {'utm_campaign': None, 'utm_source': None},
+    }
+
+
+def make_bookings(rng, prefix, event_types, invitees, count, cancelled=0.05, protected=0.02,
+                  stray=0.05, batch_size=1000):
+    """
+    Bookings spread over event_types, mostly by invitees, stray ones by
+    emails of no invitee
+    @param event_types list of (event_type_id, name)
+    @return number of bookings
+    """
+    now = timezone.now()
+    spots = {
+        event_type: now + timedelta(days=rng.randint(-60, 60))
+        for event_type in event_types
+    }
+
+    made = 0
+    for start in range(0, count, batch_size):
+        bookings, calendly_data = [], []
+        for i in range(start, min(count, start + batch_size)):
+            event_type = rng.choice(event_types)
+            invitee = None
+            if rng.random() < stray:
+                email = '{}.stray.{:06d}@example.com'.format(prefix, i)
+            else:
+                invitee = rng.choice(invitees)
+                email = invitee.email
+            spot_start = spots[event_type] + timedelta(minutes=15 * rng.randint(0, 24 * 4 * 14))
+            spot_end = spot_start + timedelta(minutes=15)
+            booked_at = spot_start - timedelta(minutes=rng.randint(60, 60 * 24 * 30))
+            cancelled_at = None
+            if rng.random() < cancelled:
+                cancelled_at = booked_at + timedelta(minutes=rng.randint(1, 60 * 24))
+            is_protected = rng.random() < protected
+
+            bookings.append(Booking(
+                event_type_id=event_type[0],
+                email=email,
+                email_normalized=normalize_email(email),
+                spot_start=spot_start,
+                spot_end=spot_end,
+                booked_at=booked_at,
+                cancelled_at=cancelled_at,
+                approval_protected=is_protected,
+                approval_status=Booking.APPROVAL_STATUS_APPROVED if is_protected else Booking.APPROVAL_STATUS_NEW,
+            ))
+            invitee_uuid = '{}-{:08d}'.format(prefix, i)
+            data = BookingCalendlyData(
+                calendly_uuid=invitee_uuid,
+                invitee=invitee,
+                payload=make_payload(rng, event_type, invitee_uuid, email,
+                    spot_start, spot_end, booked_at, cancelled_at),
+            )
+            data.pack_payload()
+            calendly_data.append(data)
+
+        with transaction.atomic():
+            bulk_create(Booking, bookings, batch_size=batch_size)
+            for booking, data in zip(bookings, calendly_data):
+                data.booking = booking
+            BookingCalendlyData.objects.bulk_create(calendly_data)
+        made += len(bookings)
+    return made
+
+
+def generate_dataset(groups=1000, invitees_per_group=10, bookings=50000, event_types=5,
+                     cancelled=0.05, protected=0.02, stray=0.05, prefix='gen', seed=None):
+    """
+    A whole dataset, reproducible for a given seed
+    @return dict of counts
+    """
+    rng = random.Random(seed)
+    event_types = [
+        ('%016X' % rng.getrandbits(64), '{} Event Type {}'.format(prefix, i + 1))
+        for i in range(event_types)
+    ]
+    group_list = make_groups(rng, prefix, groups)
+    invitee_list = make_invitees(rng, prefix, group_list, invitees_per_group)
+    booking_count = make_bookings(rng, prefix, event_types, invitee_list, bookings,
+        cancelled=cancelled, protected=protected, stray=stray)
+
+    for event_type_id, name in event_types:
+        EventType.objects.refresh(event_type_id, name=name)
+        ReportChange.objects.record(event_type_id, [None])
+
+    return {
+        'event_types': [event_type_id for event_type_id, name in event_types],
+        'groups': len(group_list),
+        'invitees': len(invitee_list),
+        'bookings': booking_count,
+    }
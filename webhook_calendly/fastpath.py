@@ -0,0 +1,131 @@
+"""
+Backend aware bulk operations. PostgreSQL gets single statements built on its
+own syntax, every other backend (SQLite in development) the portable ORM
+equivalent, DATABASE_FAST_PATHS = False forces the latter everywhere
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Value, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
+
+
+def enabled():
+    return settings.DATABASE_FAST_PATHS and connection.vendor == 'postgresql'
+
+
+def insert_ignore(model, objs, unique):
+    """
+    Insert objs, skipping the ones whose unique fields are taken already
+    (INSERT ... ON CONFLICT DO NOTHING)
+    """
+    if enabled() and connection.features.supports_ignore_conflicts:
+        model._base_manager.bulk_create(objs, ignore_conflicts=True)
+        return
+
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    for obj in objs:
+        values = {f.attname: getattr(obj, f.attname) for f in fields}
+        lookup = {}
+        for name in unique:
+            attname = model._meta.get_field(name).attname
+            lookup[attname] = values.pop(attname)
+        model._base_manager.get_or_create(defaults=values, **lookup)
+
+
+def update_values(model, field, values, batch_size=1000, **extra):
+    """
+    Set field to a value of its own for every row, extra to the same value
+    for all of them (UPDATE ... FROM (VALUES ...))
+    @param values dict of pk: value
+    @return number of rows updated
+    """
+    if not values:
+        return 0
+
+    if not enabled():
+        by_value = {}
+        for pk, value in values.items():
+            by_value.setdefault(value, []).append(pk)
+        # batches keep IN lists below the parameter limits of SQLite
+        return sum(
+            model._base_manager.filter(pk__in=pks[start:start + batch_size]).update(**{field: value}, **extra)
+            for value, pks in by_value.items()
+            for start in range(0, len(pks), batch_size)
+        )
+
+    meta = model._meta
+    qn = connection.ops.quote_name
+    field = meta.get_field(field)
+    extra = [(meta.get_field(name), value) for name, value in extra.items()]
+    pk_type = meta.pk.db_type(connection)
+    if pk_type == 'serial':
+        pk_type = 'integer'
+    assignments = ', '.join(
+        ['{0} = v.value'.format(qn(field.column))]
+        + ['{} = %s'.format(qn(f.column)) for f, _ in extra]
+    )
+    extra_params = [f.get_db_prep_save(value, connection) for f, value in extra]
+
+    updated = 0
+    items = list(values.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            rows = ', '.join(['(%s::{}, %s::{})'.format(pk_type, field.db_type(connection))] * len(batch))
+            params = []
+            for pk, value in batch:
+                params += [pk, field.get_db_prep_save(value, connection)]
+            cursor.execute(
+                'UPDATE {table} AS t SET {assignments} FROM (VALUES {rows}) AS v(pk, value) '
+                'WHERE t.{pk} = v.pk'.format(
+                    table=qn(meta.db_table), assignments=assignments, rows=rows, pk=qn(meta.pk.column)),
+                extra_params + params)
+            updated += cursor.rowcount
+    return updated
+
+
+def first_per_group(queryset, group, order):
+    """
+    The rows of queryset coming first in each group, ties broken by pk
+    (SELECT DISTINCT ON (group))
+    @return list of pks
+    """
+    if enabled():
+        return list(queryset.order_by(F(group), order, 'pk').distinct(group).values_list('pk', flat=True))
+
+    earlier = queryset.filter(**{group: OuterRef(group)}).filter(
+        Q(**{order + '__lt': OuterRef(order)}) | Q(**{order: OuterRef(order), 'pk__lt': OuterRef('pk')}))
+    return list(queryset.annotate(has_earlier=Exists(earlier.values('pk'))).filter(
+        has_earlier=False).order_by().values_list('pk', flat=True))
+
+
+def rank_in_group(queryset, group, order):
+    """
+    Annotate rows with group_rank, their 1-based position in their group,
+    ties broken by pk (ROW_NUMBER() OVER (PARTITION BY group ORDER BY order))
+    """
+    if enabled() and connection.features.supports_over_clause:
+        return queryset.annotate(group_rank=Window(
+            RowNumber(), partition_by=[F(group)], order_by=[F(order).asc(), F('pk').asc()]))
+
+    earlier = queryset.filter(**{group: OuterRef(group)}).filter(
+        Q(**{order + '__lt': OuterRef(order)}) | Q(**{order: OuterRef(order), 'pk__lt': OuterRef('pk')}))
+    earlier = earlier.order_by().values(group).annotate(n=Count('pk')).values('n')
+    return queryset.annotate(group_rank=Coalesce(
+        Subquery(earlier, output_field=IntegerField()), Value(0)) + Value(1))
+
+
+def first_in_group(queryset, group, order):
+    """
+    Condition matching the rows of queryset ranked first in their group,
+    exclude() it for the ones ranked after, neither loads any rows
+    @return Q
+    """
+    ranked = rank_in_group(queryset.order_by(), group, order)
+    if enabled() and connection.features.supports_over_clause:
+        # window functions cannot be filtered on in the same SELECT
+        sql, params = ranked.values_list('pk', 'group_rank').query.sql_with_params()
+        return Q(pk__in=RawSQL(
+            'SELECT r.pk FROM ({}) AS r(pk, group_rank) WHERE r.group_rank = 1'.format(sql), params))
+    return Q(pk__in=ranked.filter(group_rank=1).values('pk'))
@@ -0,0 +1,26 @@
+"""
+Model fields storing the same values on every backend the app runs on
+"""
+from django.contrib.postgres.fields.jsonb import JSONField as PostgresJSONField, JsonAdapter
+import json
+
+
+class JSONField(PostgresJSONField):
+    """
+    jsonb on PostgreSQL, JSON text on other backends (SQLite in development),
+    where whole values and top-level keys can be compared
+    """
+    def get_prep_value(self, value):
+        return value
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        if connection.vendor == 'postgresql':
+            return JsonAdapter(value, encoder=self.encoder)
+        return json.dumps(value, cls=self.encoder)
+
+    def from_db_value(self, value, expression, connection):
+        if connection.vendor != 'postgresql' and isinstance(value, str):
+            return json.loads(value)
+        return value
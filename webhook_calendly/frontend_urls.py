@@ -4,5 +4,6 @@ from .views import frontend
 urlpatterns = [
     path('', frontend.student_reports, name='student_reports'),
     path('invitees/', frontend.student_reports),
-    path('reports/', frontend.admin_reports, name='admin_reports')
+    path('reports/', frontend.admin_reports, name='admin_reports'),
+    path('changes/', frontend.report_changes, name='report_changes'),
 ]
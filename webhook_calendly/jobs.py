@@ -0,0 +1,114 @@
+from django.apps import apps
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from bookings.models import Booking
+from .models import ApprovalGroup, Invitee, BookingCalendlyData, ReportChange, Job, SweepWatermark
+from .replica import replica_reads
+
+
+JOBS = {}
+
+
+def job(func):
+    """
+    Register func to be run by the job worker, it receives the Job and the
+    kwargs given to Job.objects.enqueue, and returns a short result message
+    """
+    JOBS[func.__name__] = func
+    return func
+
+
+@job
+def execute_approval(job, group_ids, event_type_id):
+    groups = ApprovalGroup.objects.filter(pk__in=group_ids)
+    job.set_progress(0, len(groups))
+    changed = []
+    for i, group in enumerate(groups, 1):
+        changed = changed + group.run_approval(event_type_id)
+        job.set_progress(i)
+    return "Updated "+str(len(changed))+" approval in "+event_type_id+"."
+
+
+@job
+def calendly_cancel(job, booking_ids, cancel_reason=""):
+    bookings_data = BookingCalendlyData.objects.filter(booking__in=booking_ids).select_related('booking')
+    job.set_progress(0, len(bookings_data))
+    failed = []
+    for i, calendly_data in enumerate(bookings_data, 1):
+        try:
+            ret = calendly_data.calendly_cancel(cancel_reason=cancel_reason)
+        except Exception as e:
+            ret = str(e)
+        if ret is not True:
+            failed.append(str(calendly_data.booking) + ": " + str(ret))
+        job.set_progress(i)
+    return "\n".join(
+        ["Cancelled "+str(len(bookings_data) - len(failed))+" booking(s) on Calendly."] + failed)
+
+
+@job
+def export(job, resource, model, pks, file_format='csv', batch_size=500):
+    """
+    Rows are exported a batch at a time, so only the rows of one batch are
+    held as model instances
+    """
+    model = apps.get_model(model)
+    resource = import_string(resource)()
+    job.set_progress(0, len(pks))
+    with replica_reads():
+        dataset = resource.export(model._base_manager.none())
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start:start + batch_size]
+            dataset.extend(resource.export(model._base_manager.filter(pk__in=batch).order_by('pk')))
+            job.set_progress(start + len(batch))
+    job.output = getattr(dataset, file_format)
+    job.output_name = '{}-{}.{}'.format(model._meta.model_name, job.pk, file_format)
+    return "Exported "+str(len(dataset))+" row(s)."
+
+
+def sweep_watermark(event_type_id):
+    """
+    @return datetime the last successful sweep of the event type covered
+    changes up to, or None
+    """
+    watermark = SweepWatermark.objects.filter(event_type_id=event_type_id).first()
+    if watermark:
+        return watermark.until
+
+
+@job
+def sweep_approvals(job, event_type_id):
+    """
+    Re-approve the groups whose settings, invitees or bookings changed since
+    the last sweep of the event type, the watermark moves on once all of
+    them are approved. It is taken before approving, so bookings a sweep
+    changes are checked once more by the next one rather than missing changes
+    made meanwhile. Groups invitees left are found by their report changes
+    """
+    since = sweep_watermark(event_type_id)
+    until = timezone.now()
+
+    groups = ApprovalGroup.objects.all()
+    if since:
+        groups = groups.annotate(
+            _invitees_changed=Exists(Invitee.objects.filter(group=OuterRef('pk'), updated_at__gt=since)),
+            _bookings_changed=Exists(Booking.all_objects.filter(
+                event_type_id=event_type_id,
+                calendly_data__invitee__group=OuterRef('pk'),
+                updated_at__gt=since)),
+            # membership changes of any event type, approvals record their own
+            _members_changed=Exists(ReportChange.objects.filter(
+                event_type_id='', group=OuterRef('pk'), created_at__gt=since)),
+        ).filter(Q(updated_at__gt=since) | Q(_invitees_changed=True) | Q(_bookings_changed=True)
+            | Q(_members_changed=True))
+
+    groups = list(groups)
+    job.set_progress(0, len(groups))
+    changed = []
+    for i, group in enumerate(groups, 1):
+        changed = changed + group.run_approval(event_type_id)
+        job.set_progress(i)
+    SweepWatermark.objects.update_or_create(event_type_id=event_type_id, defaults={'until': until})
+    return "Swept "+str(len(groups))+" group(s), updated "+str(len(changed))+" approval in "+event_type_id+"."
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from bookings.models import Booking
+from ...models import ArchivedBookingCalendlyData
+from ...views.frontend import get_default_event_type_id
+
+
+class Command(BaseCommand):
+    help = 'Move bookings of finished event types to the archive tables, or back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_type_ids', nargs='*',
+            help='Event types to move')
+        parser.add_argument('--finished', action='store_true',
+            help='Archive every event type whose last spot has ended')
+        parser.add_argument('--restore', action='store_true',
+            help='Move the event types back from the archive')
+        parser.add_argument('--batch-size', type=int, default=1000,
+            help='Bookings moved per transaction')
+
+    def handle(self, *args, **options):
+        event_type_ids = list(options['event_type_ids'])
+        if options['finished']:
+            event_type_ids += Booking.all_objects.order_by().values('event_type_id').annotate(
+                last_spot_end=Max('spot_end')
+            ).filter(last_spot_end__lt=timezone.now()).values_list('event_type_id', flat=True)
+        if not event_type_ids:
+            raise CommandError('Give event type ids or --finished')
+
+        if options['restore']:
+            for event_type_id in event_type_ids:
+                moved = ArchivedBookingCalendlyData.objects.restore(event_type_id, options['batch_size'])
+                self.stdout.write('Restored {} booking(s) of {}'.format(moved, event_type_id))
+            return
+
+        default_event_type_id = get_default_event_type_id()
+        for event_type_id in event_type_ids:
+            if event_type_id == default_event_type_id:
+                self.stderr.write('Skipped {}, the default event type'.format(event_type_id))
+                continue
+            moved = ArchivedBookingCalendlyData.objects.archive(event_type_id, options['batch_size'])
+            self.stdout.write('Archived {} booking(s) of {}'.format(moved, event_type_id))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+import time
+
+from ...models import ReportChange
+
+
+class Command(BaseCommand):
+    help = 'Time requests reconnecting to the database against requests reusing a connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+            help='Requests to time in each mode')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+            help='Database alias to connect to')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        timings = {}
+        for mode, reconnect in (('reconnecting', True), ('persistent', False)):
+            connection.close()
+            start = time.perf_counter()
+            for _ in range(options['requests']):
+                # about the cheapest query a webhook or report makes
+                ReportChange.objects.db_manager(options['database']).latest_version()
+                if reconnect:
+                    connection.close()
+            timings[mode] = (time.perf_counter() - start) * 1000 / options['requests']
+            self.stdout.write('{}: {:.2f} ms/request'.format(mode, timings[mode]))
+
+        self.stdout.write('saved by persistent connections: {:.2f} ms/request (CONN_MAX_AGE is {})'.format(
+            timings['reconnecting'] - timings['persistent'], connection.settings_dict['CONN_MAX_AGE']))
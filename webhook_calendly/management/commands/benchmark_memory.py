@@ -0,0 +1,88 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from django.urls import reverse
+from constance import config
+import json
+import time
+import tracemalloc
+
+from bookings.models import Booking
+from ...models import ApprovalGroup, Job
+from ...views.frontend import get_default_event_type_id, student_reports, admin_reports
+from ...views.hook import webhook_post
+
+PATHS = ('webhook', 'approval', 'reports', 'export')
+
+
+class Command(BaseCommand):
+    help = 'Measure peak Python memory of the main paths on the current data, changes are rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS,
+            help='Paths to measure')
+        parser.add_argument('--event-type-id', default=None,
+            help='Event type to approve, report and export (default the default one)')
+        parser.add_argument('--hooks', type=int, default=100,
+            help='Webhooks to post for the webhook path')
+
+    def handle(self, *args, **options):
+        self.event_type_id = options['event_type_id'] or get_default_event_type_id()
+        if not self.event_type_id:
+            raise CommandError('There is no default event_type_id')
+        self.factory = RequestFactory(HTTP_HOST='localhost')
+        self.options = options
+
+        with transaction.atomic():
+            for path in options['paths']:
+                tracemalloc.start()
+                start = time.perf_counter()
+                result = getattr(self, 'run_' + path)()
+                seconds = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.stdout.write('{}: peak {:.1f} MB, {:.0f} ms, {}'.format(
+                    path, peak / 1024 / 1024, seconds * 1000, result))
+            transaction.set_rollback(True)
+
+    def run_webhook(self):
+        url = reverse('webhook_post') + '?token=' + config.WEBHOOK_TOKEN
+        for i in range(self.options['hooks']):
+            payload = {
+                'event_type': {'uuid': 'benchmark-memory', 'name': 'Benchmark'},
+                'event': {
+                    'invitee_start_time': '2019-01-01T12:00:00Z',
+                    'invitee_end_time': '2019-01-01T12:15:00Z',
+                },
+                'invitee': {
+                    'uuid': 'benchmark-memory-{}'.format(i),
+                    'email': 'benchmark-{}@example.com'.format(i),
+                    'created_at': '2019-01-01T00:00:00Z',
+                },
+            }
+            webhook_post(self.factory.post(url, data=json.dumps({'event': 'invitee.created', 'payload': payload}),
+                content_type='application/json'))
+        return '{} webhook(s)'.format(self.options['hooks'])
+
+    def run_approval(self):
+        groups = 0
+        for group in ApprovalGroup.objects.iterator():
+            group.run_approval(self.event_type_id, fake=True)
+            groups += 1
+        return '{} group(s)'.format(groups)
+
+    def run_reports(self):
+        student_reports(self.factory.get('/'))
+        request = self.factory.get('/', {'event_type_id': self.event_type_id})
+        request.user = User(is_active=True, is_staff=True, is_superuser=True)
+        admin_reports(request)
+        return 'student and admin reports'
+
+    def run_export(self):
+        pks = list(Booking.all_objects.filter(event_type_id=self.event_type_id).values_list('pk', flat=True))
+        job = Job.objects.run_now('export',
+            resource='webhook_calendly.admin.BookingCalendlyIEResource', model='bookings.Booking', pks=pks)
+        if job.status != Job.STATUS_DONE:
+            raise CommandError(job.result)
+        return job.result
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import json
+import os
+import subprocess
+import sys
+
+# loads the app like a fresh gunicorn worker, up to the first request
+STARTUP_SCRIPT = '''
+import json, resource, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Time startup and peak memory of a fresh process for each settings module'
+
+    def add_arguments(self, parser):
+        parser.add_argument('settings_modules', nargs='*',
+            help='Settings modules to compare (default the current one and calendly_helper.settings_webhook)')
+        parser.add_argument('--runs', type=int, default=3,
+            help='Processes started per settings module, the fastest counts')
+
+    def handle(self, *args, **options):
+        settings_modules = options['settings_modules'] or [
+            os.environ.get('DJANGO_SETTINGS_MODULE', 'calendly_helper.settings'),
+            'calendly_helper.settings_webhook',
+        ]
+        for settings_module in settings_modules:
+            results = []
+            for _ in range(options['runs']):
+                output = subprocess.run(
+                    [sys.executable, '-c', STARTUP_SCRIPT],
+                    env=dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module),
+                    cwd=settings.BASE_DIR, stdout=subprocess.PIPE, check=True,
+                ).stdout
+                results.append(json.loads(output.decode().splitlines()[-1]))
+            best = min(results, key=lambda r: r['seconds'])
+            self.stdout.write('{}: {:.0f} ms, {:.1f} MB max RSS, {} modules'.format(
+                settings_module, best['seconds'] * 1000, best['max_rss_kb'] / 1024, best['modules']))
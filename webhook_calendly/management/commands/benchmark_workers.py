@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from concurrent.futures import ThreadPoolExecutor
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+# runs gunicorn like the gunicorn script, the worker class comes from argv
+GUNICORN_SCRIPT = '''
+import sys
+from gunicorn.app.wsgiapp import run
+sys.argv[0] = 'gunicorn'
+run()
+'''
+
+
+def wait_app(environ, start_response):
+    """
+    A request spending its time waiting, like one calling Calendly or
+    waiting on the database, without touching either
+    """
+    time.sleep(int(os.environ.get('BENCHMARK_WAIT_MS', 100)) / 1000)
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'ok']
+
+
+class Command(BaseCommand):
+    help = 'Compare the throughput of sync and threaded gunicorn workers on requests waiting on I/O'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100,
+            help='Requests sent to each worker class')
+        parser.add_argument('--concurrency', type=int, default=16,
+            help='Requests sent at the same time')
+        parser.add_argument('--wait', type=int, default=100,
+            help='Milliseconds each request waits')
+        parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 2)),
+            help='Worker processes, like WEB_CONCURRENCY')
+        parser.add_argument('--threads', type=int, default=int(os.environ.get('GUNICORN_THREADS', 4)),
+            help='Threads per gthread worker, like GUNICORN_THREADS')
+
+    def handle(self, *args, **options):
+        throughput = {}
+        for worker_class, threads in (('sync', 1), ('gthread', options['threads'])):
+            throughput[worker_class] = self.run_server(worker_class, threads, options)
+            self.stdout.write('{} ({} workers x {} threads): {:.1f} requests/s'.format(
+                worker_class, options['workers'], threads, throughput[worker_class]))
+
+        self.stdout.write('threaded workers serve {:.1f}x the requests of sync ones'.format(
+            throughput['gthread'] / throughput['sync']))
+
+    def run_server(self, worker_class, threads, options):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        url = 'http://127.0.0.1:{}/'.format(port)
+
+        # started away from the project, so no gunicorn.conf.py gets picked up
+        with tempfile.TemporaryDirectory() as cwd:
+            server = subprocess.Popen(
+                [sys.executable, '-c', GUNICORN_SCRIPT,
+                 '--bind', '127.0.0.1:{}'.format(port),
+                 '--worker-class', worker_class,
+                 '--workers', str(options['workers']),
+                 '--threads', str(threads),
+                 '--pythonpath', settings.BASE_DIR,
+                 '--log-level', 'warning',
+                 __name__ + ':wait_app'],
+                env=dict(os.environ, BENCHMARK_WAIT_MS=str(options['wait'])), cwd=cwd)
+            try:
+                self.wait_until_up(url, server)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(options['concurrency']) as pool:
+                    list(pool.map(self.get, [url] * options['requests']))
+                return options['requests'] / (time.perf_counter() - start)
+            finally:
+                server.terminate()
+                server.wait()
+
+    def wait_until_up(self, url, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('gunicorn exited with code {}'.format(server.returncode))
+            try:
+                return self.get(url)
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError('gunicorn did not start within {} seconds'.format(timeout))
+
+    def get(self, url):
+        with urllib.request.urlopen(url, timeout=60) as f:
+            return f.read()
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+
+from ...models import BookingCalendlyData, ArchivedBookingCalendlyData, compact_payloads
+
+
+class Command(BaseCommand):
+    help = 'Compress stored Calendly payloads and trim old ones, as configured in settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=settings.CALENDLY_PAYLOAD_RETENTION_DAYS,
+            help='Trim payloads of spots ended this many days ago (default CALENDLY_PAYLOAD_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=500,
+            help='Rows updated per query')
+
+    def handle(self, *args, **options):
+        for model in (BookingCalendlyData, ArchivedBookingCalendlyData):
+            rows = model.objects.order_by('pk')
+            if settings.CALENDLY_PAYLOAD_COMPRESSION:
+                pending = rows.filter(payload_zlib=None).exclude(payload={})
+            else:
+                pending = rows.exclude(payload_zlib=None)
+            compacted = compact_payloads(pending, batch_size=options['batch_size'])
+
+            trimmed = 0
+            if options['retention_days'] is not None:
+                cutoff = timezone.now() - timedelta(days=options['retention_days'])
+                trimmed = compact_payloads(
+                    rows.filter(payload_trimmed=False, booking__spot_end__lt=cutoff),
+                    trim=True, batch_size=options['batch_size'])
+
+            self.stdout.write('{}: stored {} payload(s) anew, trimmed {}'.format(
+                model._meta.verbose_name_plural, compacted, trimmed))
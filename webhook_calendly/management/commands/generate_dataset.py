@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+import time
+
+from ...factories import generate_dataset
+from ...models import ApprovalGroup
+
+
+class Command(BaseCommand):
+    help = 'Insert a synthetic dataset of groups, invitees and bookings, to test performance locally'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, default=1000)
+        parser.add_argument('--invitees-per-group', type=int, default=10)
+        parser.add_argument('--bookings', type=int, default=50000)
+        parser.add_argument('--event-types', type=int, default=5)
+        parser.add_argument('--cancelled', type=float, default=0.05,
+            help='Share of bookings cancelled')
+        parser.add_argument('--protected', type=float, default=0.02,
+            help='Share of bookings approved by hand and protected')
+        parser.add_argument('--stray', type=float, default=0.05,
+            help='Share of bookings by emails of no invitee')
+        parser.add_argument('--prefix', default='gen',
+            help='Prefix of names, emails and uuids, use another one to add a second dataset')
+        parser.add_argument('--seed', type=int, default=None,
+            help='Random seed, the same seed makes the same dataset')
+        parser.add_argument('--approve', action='store_true',
+            help='Run approval of every group for every event type afterwards')
+
+    def handle(self, *args, **options):
+        if ApprovalGroup.objects.filter(name__startswith=options['prefix'] + ' ').exists():
+            raise CommandError('There is a dataset with prefix "{}" already'.format(options['prefix']))
+
+        start = time.perf_counter()
+        counts = generate_dataset(
+            groups=options['groups'],
+            invitees_per_group=options['invitees_per_group'],
+            bookings=options['bookings'],
+            event_types=options['event_types'],
+            cancelled=options['cancelled'],
+            protected=options['protected'],
+            stray=options['stray'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+        )
+        self.stdout.write('Inserted {groups} group(s), {invitees} invitee(s) and {bookings} booking(s) in {seconds:.1f} s'.format(
+            seconds=time.perf_counter() - start, **counts))
+        self.stdout.write('Event types: ' + ', '.join(counts['event_types']))
+
+        if options['approve']:
+            start = time.perf_counter()
+            groups = ApprovalGroup.objects.filter(name__startswith=options['prefix'] + ' ')
+            for event_type_id in counts['event_types']:
+                for group in groups:
+                    group.run_approval(event_type_id)
+            self.stdout.write('Approved in {:.1f} s'.format(time.perf_counter() - start))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ...models import Invitee, BookingCalendlyData
+
+
+class Command(BaseCommand):
+    help = 'Backfill the invitee of every booking from its email'
+
+    def handle(self, *args, **options):
+        linked = 0
+        for invitee in Invitee.objects.iterator():
+            linked += invitee.link_bookings()
+        # emails no longer belonging to any invitee
+        BookingCalendlyData.objects.exclude(invitee=None).exclude(
+            booking__email_normalized__in=Invitee.objects.values('email_normalized')
+        ).update(invitee=None)
+        self.stdout.write('Linked {} booking(s)'.format(linked))
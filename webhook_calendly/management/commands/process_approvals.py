@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+import time
+
+from ...models import PendingApproval
+
+
+class Command(BaseCommand):
+    help = 'Run debounced approvals of groups marked by webhooks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+            help='Keep running, instead of processing due groups once')
+        parser.add_argument('--interval', type=float, default=1,
+            help='Seconds to sleep between checks with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            runs = PendingApproval.objects.run_due()
+            if runs:
+                self.stdout.write('Approved {} group(s)'.format(runs))
+            if not options['loop']:
+                break
+            # replace connections past CONN_MAX_AGE or dropped while idle
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from bookings.models import Booking
+from ...models import EventType
+
+
+class Command(BaseCommand):
+    help = 'Recount the bookings of every event type, to backfill or repair the counts webhooks move'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event-type-id',
+            help='Event type to recount, instead of all of them')
+
+    def handle(self, *args, **options):
+        if options['event_type_id']:
+            event_type_ids = {options['event_type_id']}
+        else:
+            event_type_ids = set(Booking.all_objects.order_by().values_list('event_type_id', flat=True).distinct())
+            event_type_ids.update(EventType.objects.values_list('event_type_id', flat=True))
+        for event_type_id in event_type_ids:
+            EventType.objects.refresh(event_type_id)
+        self.stdout.write('Recounted {} event type(s)'.format(len(event_type_ids)))
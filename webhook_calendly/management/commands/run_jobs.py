@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import close_old_connections
+import time
+
+from ...models import Job
+
+
+class Command(BaseCommand):
+    help = 'Run jobs queued by admin actions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+            help='Keep running, instead of stopping once the queue is empty')
+        parser.add_argument('--interval', type=float, default=1,
+            help='Seconds to sleep when the queue is empty with --loop')
+        parser.add_argument('--running-timeout', type=int, default=settings.JOB_RUNNING_TIMEOUT,
+            help='Seconds after which jobs still running are marked failed, left by a stopped worker')
+
+    def handle(self, *args, **options):
+        stale = Job.objects.fail_stale(options['running_timeout'])
+        if stale:
+            self.stdout.write('Marked {} stale job(s) failed'.format(stale))
+        while True:
+            job = Job.objects.run_next()
+            if job:
+                self.stdout.write('{}: {}'.format(job, job.get_status_display()))
+                continue
+            if not options['loop']:
+                break
+            # replace connections past CONN_MAX_AGE or dropped while idle
+            close_old_connections()
+            Job.objects.fail_stale(options['running_timeout'])
+            time.sleep(options['interval'])
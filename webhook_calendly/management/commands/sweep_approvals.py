@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+import time
+
+from ...models import Job
+from ...views.frontend import get_default_event_type_id
+
+
+class Command(BaseCommand):
+    help = 'Re-approve groups changed since the last sweep'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event-type-id',
+            help='Event type to approve, instead of the default one')
+        parser.add_argument('--loop', action='store_true',
+            help='Keep running, instead of sweeping once (e.g. from cron)')
+        parser.add_argument('--interval', type=float, default=300,
+            help='Seconds to sleep between sweeps with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            event_type_id = options['event_type_id'] or get_default_event_type_id()
+            if not event_type_id:
+                if not options['loop']:
+                    raise CommandError('There is no default event_type_id')
+            else:
+                job = Job.objects.run_now('sweep_approvals', event_type_id=event_type_id)
+                self.stdout.write('{}: {}'.format(job, job.result))
+            if not options['loop']:
+                break
+            # replace connections past CONN_MAX_AGE or dropped while idle
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+
+from ...models import ReportChange
+
+
+class Command(BaseCommand):
+    help = 'Delete report changes older than any page still catching up would ask for'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-hours', type=int, default=settings.REPORT_CHANGES_RETENTION_HOURS,
+            help='Keep changes of this many hours (default REPORT_CHANGES_RETENTION_HOURS)')
+
+    def handle(self, *args, **options):
+        deleted = ReportChange.objects.trim(timezone.now() - timedelta(hours=options['retention_hours']))
+        self.stdout.write('Deleted {} report change(s), changes are kept since version {}'.format(
+            deleted, ReportChange.objects.oldest_version()))
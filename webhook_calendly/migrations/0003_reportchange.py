@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-19 17:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook_calendly', '0002_payload_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type_id', models.CharField(db_index=True, default='', max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='webhook_calendly.ApprovalGroup')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-19 17:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook_calendly', '0003_reportchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingApproval',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type_id', models.CharField(default='', max_length=32)),
+                ('requested_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='webhook_calendly.ApprovalGroup')),
+            ],
+            options={
+                'unique_together': {('group', 'event_type_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-19 17:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_invitees(apps, schema_editor):
+    Invitee = apps.get_model('webhook_calendly', 'Invitee')
+    BookingCalendlyData = apps.get_model('webhook_calendly', 'BookingCalendlyData')
+    for invitee in Invitee.objects.all():
+        BookingCalendlyData.objects.filter(
+            booking__email=invitee.email).update(invitee=invitee)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook_calendly', '0004_pendingapproval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookingcalendlydata',
+            name='invitee',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='webhook_calendly.Invitee'),
+        ),
+        migrations.RunPython(link_invitees, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.28 on 2026-10-19 17:46
+
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def normalize_emails(apps, schema_editor):
+    Invitee = apps.get_model('webhook_calendly', 'Invitee')
+    BookingCalendlyData = apps.get_model('webhook_calendly', 'BookingCalendlyData')
+    Invitee.objects.update(email_normalized=Lower(Trim('email')))
+    # bookings missed before because of their capitalization
+    for invitee in Invitee.objects.all():
+        BookingCalendlyData.objects.filter(
+            booking__email_normalized=invitee.email_normalized).update(invitee=invitee)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_booking_email_normalized'),
+        ('webhook_calendly', '0005_bookingcalendlydata_invitee'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invitee',
+            name='email_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.28 on 2026-10-19 17:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_booking_email_normalized'),
+        ('webhook_calendly', '0008_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApprovalEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_status', models.CharField(choices=[('NEW', 'New'), ('APPROVED', 'Approved'), ('DECLINED', 'Declined')], max_length=16)),
+                ('new_status', models.CharField(choices=[('NEW', 'New'), ('APPROVED', 'Approved'), ('DECLINED', 'Declined')], max_length=16)),
+                ('run_id', models.UUIDField(db_index=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('booking', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='bookings.Booking')),
+                ('group', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='webhook_calendly.ApprovalGroup')),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+    ]
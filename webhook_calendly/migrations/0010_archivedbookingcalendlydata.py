@@ -0,0 +1,26 @@
+# Generated by Django 2.2.28 on 2026-10-19 17:56
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_archivedbooking'),
+        ('webhook_calendly', '0009_approvalevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBookingCalendlyData',
+            fields=[
+                ('payload', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('calendly_uuid', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('approval_group', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='webhook_calendly.ApprovalGroup')),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='calendly_data', to='bookings.ArchivedBooking')),
+                ('invitee', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='webhook_calendly.Invitee')),
+            ],
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 2.2.28 on 2026-10-19 17:58
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+
+
+def summarize_event_types(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingCalendlyData = apps.get_model('webhook_calendly', 'BookingCalendlyData')
+    EventType = apps.get_model('webhook_calendly', 'EventType')
+    ReportChange = apps.get_model('webhook_calendly', 'ReportChange')
+    report_version = ReportChange.objects.aggregate(version=Max('id'))['version'] or 0
+    summaries = Booking.objects.order_by().values('event_type_id').annotate(
+        new_count=Count('id', filter=Q(cancelled_at=None, approval_status='NEW')),
+        approved_count=Count('id', filter=Q(cancelled_at=None, approval_status='APPROVED')),
+        declined_count=Count('id', filter=Q(cancelled_at=None, approval_status='DECLINED')),
+        cancelled_count=Count('id', filter=~Q(cancelled_at=None)),
+        first_spot=Min('spot_start'),
+        last_spot=Max('spot_start'),
+    )
+    for summary in summaries:
+        calendly_data = BookingCalendlyData.objects.filter(
+            booking__event_type_id=summary['event_type_id']).order_by('-booking__booked_at').first()
+        name = calendly_data.payload.get('event_type', {}).get('name', '') if calendly_data else ''
+        EventType.objects.create(name=name or '', report_version=report_version, **summary)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_archivedbooking'),
+        ('webhook_calendly', '0010_archivedbookingcalendlydata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventType',
+            fields=[
+                ('event_type_id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('new_count', models.PositiveIntegerField(default=0)),
+                ('approved_count', models.PositiveIntegerField(default=0)),
+                ('declined_count', models.PositiveIntegerField(default=0)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+                ('first_spot', models.DateTimeField(blank=True, null=True)),
+                ('last_spot', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('report_version', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-last_spot'],
+            },
+        ),
+        migrations.RunPython(summarize_event_types, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:01
+
+from django.db import migrations, models
+import json
+import zlib
+
+
+def decompress_payloads(apps, schema_editor):
+    # payloads are stored compressed by compact_payloads, keep them once
+    # payload_zlib goes away
+    for model_name in ('BookingCalendlyData', 'ArchivedBookingCalendlyData'):
+        model = apps.get_model('webhook_calendly', model_name)
+        rows = model.objects.exclude(payload_zlib=None).only('pk', 'payload_zlib').order_by('pk')
+        batch = []
+        for obj in rows.iterator(chunk_size=500):
+            obj.payload = json.loads(zlib.decompress(obj.payload_zlib).decode())
+            batch.append(obj)
+            if len(batch) == 500:
+                model.objects.bulk_update(batch, ['payload'])
+                batch = []
+        model.objects.bulk_update(batch, ['payload'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook_calendly', '0011_eventtype'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedbookingcalendlydata',
+            name='payload_trimmed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='archivedbookingcalendlydata',
+            name='payload_zlib',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookingcalendlydata',
+            name='payload_trimmed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='bookingcalendlydata',
+            name='payload_zlib',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, decompress_payloads),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:41
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicate_invitees(apps, schema_editor):
+    '''
+    Invitees whose emails differ only by case or spaces become the one
+    edited last, keeping the group of another if it had none, before
+    email_normalized turns unique
+    '''
+    Invitee = apps.get_model('webhook_calendly', 'Invitee')
+    BookingCalendlyData = apps.get_model('webhook_calendly', 'BookingCalendlyData')
+    ArchivedBookingCalendlyData = apps.get_model('webhook_calendly', 'ArchivedBookingCalendlyData')
+    duplicates = Invitee.objects.order_by().values('email_normalized').annotate(
+        count=Count('id')).filter(count__gt=1).values_list('email_normalized', flat=True)
+    for email_normalized in list(duplicates):
+        invitees = list(Invitee.objects.filter(
+            email_normalized=email_normalized).order_by('-updated_at', '-id'))
+        kept, others = invitees[0], invitees[1:]
+        if kept.group_id is None:
+            kept.group_id = next((i.group_id for i in others if i.group_id), None)
+            kept.save(update_fields=['group'])
+        BookingCalendlyData.objects.filter(invitee__in=others).update(invitee=kept)
+        ArchivedBookingCalendlyData.objects.filter(invitee__in=others).update(invitee=kept)
+        print('\n  Merged invitees {} into {}'.format(', '.join(i.email for i in others), kept.email))
+        Invitee.objects.filter(pk__in=[i.pk for i in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook_calendly', '0012_payload_zlib'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_invitees, migrations.RunPython.noop),
+    ]
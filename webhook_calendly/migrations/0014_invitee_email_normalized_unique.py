@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook_calendly', '0013_merge_duplicate_invitees'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invitee',
+            name='email_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=254, unique=True),
+        ),
+    ]
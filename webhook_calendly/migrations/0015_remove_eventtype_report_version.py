@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook_calendly', '0014_invitee_email_normalized_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='eventtype',
+            name='report_version',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:53
+
+from django.db import migrations
+import webhook_calendly.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook_calendly', '0015_remove_eventtype_report_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedbookingcalendlydata',
+            name='payload',
+            field=webhook_calendly.fields.JSONField(default=dict),
+        ),
+        migrations.AlterField(
+            model_name='bookingcalendlydata',
+            name='payload',
+            field=webhook_calendly.fields.JSONField(default=dict),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='kwargs',
+            field=webhook_calendly.fields.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-19 19:08
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+
+def copy_sweep_watermarks(apps, schema_editor):
+    # watermarks were kept in the kwargs of the sweep jobs, latest first
+    Job = apps.get_model('webhook_calendly', 'Job')
+    SweepWatermark = apps.get_model('webhook_calendly', 'SweepWatermark')
+    watermarks = {}
+    for kwargs in Job.objects.filter(name='sweep_approvals', status='DONE').order_by(
+            '-finished_at').values_list('kwargs', flat=True).iterator():
+        if kwargs.get('until'):
+            watermarks.setdefault(kwargs.get('event_type_id'), parse_datetime(kwargs['until']))
+    SweepWatermark.objects.bulk_create([
+        SweepWatermark(event_type_id=event_type_id, until=until) for event_type_id, until in watermarks.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook_calendly', '0016_portable_jsonfield'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SweepWatermark',
+            fields=[
+                ('event_type_id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('until', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(copy_sweep_watermarks, migrations.RunPython.noop),
+    ]
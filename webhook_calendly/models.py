@@ -1,16 +1,99 @@
-from django.db import models, transaction
-from bookings.models import Booking
-from django.contrib.postgres.fields import JSONField
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction, connection
+from django.db.models import Case, Count, F, Max, Min, Q, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from bookings.models import Booking, ArchivedBooking, normalize_email
+from . import fastpath
+from .fields import JSONField
 from django.contrib.auth.models import User
-from django.contrib.admin.models import LogEntry, CHANGE
-from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from constance import config
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+from datetime import timedelta
 import urllib.request
 import json
+import logging
+import threading
+import uuid
+import weakref
+import zlib
+
+
+logger = logging.getLogger(__name__)
+
+# a lock lives as long as a thread holds or waits for it
+_local_group_locks = weakref.WeakValueDictionary()
+_local_group_locks_guard = threading.Lock()
+_collected_changes = threading.local()
+
+
+class ApprovalGroupManager(models.Manager):
+    def approval_diff(self, event_type_id, groups):
+        """
+        Status changes an approval run of the groups would make, decided for
+        all of them by a single query returning only the bookings to change
+        @return list of (booking id, group id, current status, new status)
+        """
+        groups = [g for g in groups if g.approval_type != ApprovalGroup.APPROVAL_TYPE_MANUAL]
+        bookings = Booking.objects.filter(
+            event_type_id=event_type_id,
+            calendly_data__invitee__group__in=groups,
+            )
+        first_booked = fastpath.first_in_group(bookings, 'calendly_data__invitee__group', 'booked_at') & Q(
+            calendly_data__invitee__group__approval_type=ApprovalGroup.APPROVAL_TYPE_FIRST_BOOKED)
+
+        return list(bookings.filter(approval_protected=False).annotate(
+            new_status=Case(
+                When(first_booked, then=Value(Booking.APPROVAL_STATUS_APPROVED)),
+                default=Value(Booking.APPROVAL_STATUS_DECLINED),
+                output_field=models.CharField()),
+            ).exclude(approval_status=F('new_status')).order_by(
+            'calendly_data__invitee__group', 'booked_at').values_list(
+            'pk', 'calendly_data__invitee__group', 'approval_status', 'new_status'))
+
+    def apply_approval_diff(self, event_type_id, diff, groups=()):
+        """
+        Execute exactly a diff from approval_diff, bookings changed, protected
+        or cancelled since are left alone. Like a run, unprotected bookings of
+        the groups in the diff are pointed at their group, changed or not
+        @param groups to point bookings at as well, even with nothing to change
+        @return list of changed booking ids
+        """
+        run_id = uuid.uuid4()
+        transitions = defaultdict(lambda: defaultdict(list))
+        for pk, group_id, current, status in diff:
+            transitions[group_id][current, status].append(pk)
+
+        changed = []
+        for group in self.filter(pk__in=set(transitions) | {g.pk for g in groups}):
+            statuses, events = {}, []
+            with group.lock():
+                for (current, status), pks in transitions[group.pk].items():
+                    for pk in Booking.objects.filter(
+                            pk__in=pks, approval_status=current, approval_protected=False
+                            ).values_list('pk', flat=True):
+                        statuses[pk] = status
+                        events.append(ApprovalEvent(booking_id=pk, group=group, run_id=run_id,
+                            old_status=current, new_status=status))
+                group_changed = list(statuses)
+                regrouped = BookingCalendlyData.objects.filter(booking__in=Booking.objects.filter(
+                    event_type_id=event_type_id, calendly_data__invitee__group=group, approval_protected=False,
+                    ).values('pk')).exclude(approval_group=group).update(approval_group=group)
+                fastpath.update_values(Booking, 'approval_status', statuses, updated_at=timezone.now())
+                ApprovalEvent.objects.bulk_create(events)
+                EventType.objects.count_transitions(event_type_id,
+                    [(e.old_status, e.new_status) for e in events])
+            if group_changed or regrouped:
+                ReportChange.objects.record(event_type_id, [group.pk])
+            changed += group_changed
+        return changed
 
 
 class ApprovalGroup(models.Model):
+    objects = ApprovalGroupManager()
+
     name = models.CharField(max_length=128, unique=True)
 
     APPROVAL_TYPE_FIRST_BOOKED = 'FIRST_BOOKED'
@@ -23,6 +106,7 @@ class ApprovalGroup(models.Model):
     )
     approval_type = models.CharField(default=APPROVAL_TYPE_FIRST_BOOKED, max_length=16,
         choices=APPROVAL_TYPE_CHOICES,)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["name"]
@@ -30,101 +114,128 @@ class ApprovalGroup(models.Model):
     def __str__(self):
         return self.name
 
+    @contextmanager
+    def lock(self):
+        """
+        Serialize approvals of this group, while other groups go in parallel.
+        Uses a row lock where supported (PostgreSQL), otherwise a lock shared
+        by the threads of this process (SQLite only serves one host anyway)
+        """
+        if connection.features.has_select_for_update:
+            with transaction.atomic():
+                ApprovalGroup.objects.select_for_update().filter(pk=self.pk).values_list('pk').get()
+                yield
+        else:
+            with _local_group_locks_guard:
+                local_lock = _local_group_locks.setdefault(self.pk, threading.RLock())
+            with local_lock, transaction.atomic():
+                yield
+
+    def run_approval(self, event_type_id, fake=False):
+        """
+        Decide and execute in one go, holding the group lock so concurrent
+        runs never decide on stale reads. Decided in SQL like previews, so
+        only the bookings to change are read, however large the group is
+        @return list of changed booking ids
+        """
+        with self.lock():
+            if self.approval_type == ApprovalGroup.APPROVAL_TYPE_MANUAL:
+                if not fake:
+                    self.update_approval_groups(Booking.objects.filter(
+                        event_type_id=event_type_id, calendly_data__invitee__group=self))
+                return []
+            diff = ApprovalGroup.objects.approval_diff(event_type_id, [self])
+            if fake:
+                return [pk for pk, _, _, _ in diff]
+            return ApprovalGroup.objects.apply_approval_diff(event_type_id, diff, groups=[self])
+
     def get_approval_executor(self, event_type_id):
         """
-        @return QuerySet
+        Decide afresh on every call, previews are signed with their decisions
+        for the admin to execute exactly those. The bookings of the group are
+        loaded, for execute_approval
+        @return approved, declined
         """
-        # 1 - get related bookings by email
-        invitees_email = [i.email for i in self.invitee_set.only('email').all()]
+        # 1 - get related bookings through their invitee, joined on ids so
+        # the statement stays the same size however large the group is
         bookings = Booking.objects.filter(
             event_type_id=event_type_id,
-            email__in=invitees_email
-            ).order_by('booked_at')
+            calendly_data__invitee__group=self
+            )
+        bookings = bookings.annotate(first_booked=Case(
+            When(fastpath.first_in_group(bookings, 'calendly_data__invitee__group', 'booked_at'), then=Value(True)),
+            default=Value(False), output_field=models.BooleanField(),
+            )).select_related('calendly_data').defer(
+            'calendly_data__payload', 'calendly_data__payload_zlib').order_by('booked_at')
 
         # 2 - decide
         if self.approval_type == ApprovalGroup.APPROVAL_TYPE_MANUAL:
-            bookings_approved = []
-            bookings_declined = []
             self.update_approval_groups(bookings)
-        else:
-            bookings = list(bookings)
-            # force getting all
+        return self.decide(bookings)
 
+    def decide(self, bookings):
+        """
+        Split the bookings of this group, annotated with first_booked
+        @return approved, declined
+        """
         if self.approval_type == ApprovalGroup.APPROVAL_TYPE_DECLINE:
-            bookings_approved = []
-            bookings_declined = bookings
+            return [], bookings
         if self.approval_type == ApprovalGroup.APPROVAL_TYPE_FIRST_BOOKED:
-            bookings_approved = bookings[0:1] # keep first booked
-            bookings_declined = bookings[1:]
-        return bookings_approved, bookings_declined
+            return ([b for b in bookings if b.first_booked],
+                    [b for b in bookings if not b.first_booked])
+        return [], []
 
     def update_approval_groups(self, qs):
-        return BookingCalendlyData.objects.filter(booking__in=list(qs)).update(approval_group=self)
+        return BookingCalendlyData.objects.filter(booking__in=qs.order_by().values('pk')).update(approval_group=self)
 
     def execute_approval(self, approved, declined, fake=False):
-        content_type_id = ContentType.objects.get_for_model(Booking).pk
+        run_id = uuid.uuid4()
+        events = []
         changed = []
+        regrouped = []
+        statuses = {}
 
-        # 3 - submit change
-        # 4 - insert logs
-        if fake:
-            for b in approved:
+        # 3 - decide changes, protected bookings are left alone
+        for status, decided in ((Booking.APPROVAL_STATUS_APPROVED, approved),
+                                (Booking.APPROVAL_STATUS_DECLINED, declined)):
+            for b in decided:
                 if b.approval_protected:
                     continue
-                b.calendly_data.approval_group = self
-                if b.approval_status != Booking.APPROVAL_STATUS_APPROVED:
-                    b.approval_status = Booking.APPROVAL_STATUS_APPROVED
-                    changed.append(b)
-            for b in declined:
-                if b.approval_protected:
-                    continue
-                b.calendly_data.approval_group = self
-                if b.approval_status != Booking.APPROVAL_STATUS_DECLINED:
-                    b.approval_status = Booking.APPROVAL_STATUS_DECLINED
+                if b.calendly_data.approval_group_id != self.pk:
+                    b.calendly_data.approval_group = self
+                    regrouped.append(b)
+                if b.approval_status != status:
+                    events.append(ApprovalEvent(booking_id=b.pk, group=self, run_id=run_id,
+                        old_status=b.approval_status, new_status=status))
+                    b.approval_status = status
+                    statuses[b.pk] = status
                     changed.append(b)
-        else:
+
+        # 4 - submit changes and insert logs, a statement each
+        if not fake:
             with transaction.atomic():
-                for b in approved:
-                    # check if it's protected or not
-                    if b.approval_protected:
-                        continue
-                    b.calendly_data.approval_group = self
-                    b.calendly_data.save()
-                    if b.approval_status != Booking.APPROVAL_STATUS_APPROVED:
-                        b.approval_status = Booking.APPROVAL_STATUS_APPROVED
-                        b.save()
-                        LogEntry.objects.log_action(
-                                    user_id=config.APPROVAL_USER_ID,
-                                    content_type_id=content_type_id,
-                                    object_id=b.pk,
-                                    object_repr=str(b),
-                                    change_message="Approved",
-                                    action_flag=CHANGE)
-                        changed.append(b)
-
-                for b in declined:
-                    # check if it's protected or not
-                    if b.approval_protected:
-                        continue
-                    b.calendly_data.approval_group = self
-                    b.calendly_data.save()
-                    if b.approval_status != Booking.APPROVAL_STATUS_DECLINED:
-                        b.approval_status = Booking.APPROVAL_STATUS_DECLINED
-                        b.save()
-                        LogEntry.objects.log_action(
-                                    user_id=config.APPROVAL_USER_ID,
-                                    content_type_id=content_type_id,
-                                    object_id=b.pk,
-                                    object_repr=str(b),
-                                    change_message="Declined",
-                                    action_flag=CHANGE)
-                        changed.append(b)
+                BookingCalendlyData.objects.filter(booking__in=[b.pk for b in regrouped]).update(approval_group=self)
+                fastpath.update_values(Booking, 'approval_status', statuses, updated_at=timezone.now())
+                ApprovalEvent.objects.bulk_create(events)
+                transitions = defaultdict(list)
+                for b, event in zip(changed, events):
+                    transitions[b.event_type_id].append((event.old_status, event.new_status))
+                    # saved as is now, saving it again moves no counts
+                    b._stored = b.get_stored()
+                for event_type_id, event_type_transitions in transitions.items():
+                    EventType.objects.count_transitions(event_type_id, event_type_transitions)
+
+            # runs changing nothing leave the report version, and caches, as they are
+            for event_type_id in set(b.event_type_id for b in changed + regrouped):
+                ReportChange.objects.record(event_type_id, [self.pk])
 
         return changed
 
 class Invitee(models.Model):
     email = models.EmailField(unique=True)
+    email_normalized = models.CharField(max_length=254, blank=True, unique=True, editable=False)
     group = models.ForeignKey(ApprovalGroup, on_delete=models.SET_NULL, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["email"]
@@ -132,16 +243,139 @@ class Invitee(models.Model):
     def __str__(self):
         return self.email
 
+    def clean(self):
+        # the same address in another case would take the other one's bookings
+        taken = Invitee.objects.filter(email_normalized=normalize_email(self.email)).exclude(pk=self.pk)
+        if taken.exists():
+            raise ValidationError({'email': 'Invitee {} has the same email already'.format(taken.first())})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Invitee, cls).from_db(db, field_names, values)
+        instance._stored = instance.get_stored()
+        return instance
+
+    def get_stored(self):
+        """
+        Values bookings and approvals depend on, receivers of post_save
+        compare them with _stored, as loaded, to tell what changed
+        """
+        return (self.__dict__.get('email_normalized'), self.__dict__.get('group_id'))
+
+    def save(self, *args, **kwargs):
+        self.email_normalized = normalize_email(self.email)
+        super(Invitee, self).save(*args, **kwargs)
+        self._stored = self.get_stored()
+
+    def link_bookings(self, unlink=True):
+        """
+        Point bookings made with this email at this invitee, and only those
+        @param unlink also unlink bookings of another email, only needed once
+        the email changed
+        @return number of bookings newly linked
+        """
+        if unlink:
+            BookingCalendlyData.objects.filter(invitee=self).exclude(
+                booking__email_normalized=self.email_normalized).update(invitee=None)
+        return BookingCalendlyData.objects.filter(
+            booking__email_normalized=self.email_normalized).exclude(invitee=self).update(invitee=self)
 
-class BookingCalendlyData(models.Model):
+
+# parts of Calendly payloads kept once trimmed, the ones bookings are made of
+PAYLOAD_RETAINED_FIELDS = {
+    'event_type': ('uuid', 'name'),
+    'event': ('invitee_start_time', 'invitee_end_time'),
+    'invitee': ('uuid', 'email', 'created_at', 'canceled', 'canceled_at'),
+}
+
+
+def trim_payload(payload):
+    return {
+        key: {name: payload[key][name] for name in names if name in payload[key]}
+        for key, names in PAYLOAD_RETAINED_FIELDS.items() if isinstance(payload.get(key), dict)
+    }
+
+
+class CompressedPayloadMixin(object):
+    """
+    Stores payload zlib compressed in payload_zlib when
+    CALENDLY_PAYLOAD_COMPRESSION is on, while payload reads the same
+    """
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(CompressedPayloadMixin, cls).from_db(db, field_names, values)
+        if instance.__dict__.get('payload_zlib'):
+            # drivers give buffers, which do not pickle into caches
+            instance.payload_zlib = bytes(instance.payload_zlib)
+            instance.payload = json.loads(zlib.decompress(instance.payload_zlib).decode())
+        return instance
+
+    def pack_payload(self):
+        """
+        Move payload to the column it is stored in, the instance is left with
+        an empty payload when compressed, like its row
+        """
+        if settings.CALENDLY_PAYLOAD_COMPRESSION:
+            self.payload_zlib = zlib.compress(json.dumps(self.payload).encode())
+            self.payload = {}
+        else:
+            self.payload_zlib = None
+
+    def save(self, *args, **kwargs):
+        if 'payload' not in self.__dict__:
+            # deferred, so it is left as it is
+            return super(CompressedPayloadMixin, self).save(*args, **kwargs)
+        payload = self.payload
+        self.pack_payload()
+        try:
+            super(CompressedPayloadMixin, self).save(*args, **kwargs)
+        finally:
+            self.payload = payload
+
+
+def compact_payloads(queryset, trim=False, batch_size=500):
+    """
+    Store payloads of queryset the way settings say, trimming them if asked.
+    Rows compacted must leave queryset, so it can be walked batch by batch
+    @return number of rows compacted
+    """
+    compacted = 0
+    while True:
+        batch = list(queryset[:batch_size])
+        if not batch:
+            return compacted
+        for obj in batch:
+            if trim:
+                obj.payload = trim_payload(obj.payload)
+                obj.payload_trimmed = True
+            obj.pack_payload()
+        queryset.model.objects.bulk_update(batch, ['payload', 'payload_zlib', 'payload_trimmed'])
+        compacted += len(batch)
+
+
+class BookingCalendlyData(CompressedPayloadMixin, models.Model):
     booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='calendly_data')
     payload = JSONField(default=dict)
+    payload_zlib = models.BinaryField(null=True, blank=True, editable=False)
+    payload_trimmed = models.BooleanField(default=False)
     calendly_uuid = models.CharField(primary_key=True, max_length=32)
     approval_group = models.ForeignKey(ApprovalGroup, on_delete=models.PROTECT, null=True, blank=True, db_index=True)
+    # resolved from booking email once, so hot paths join on integers
+    invitee = models.ForeignKey(Invitee, on_delete=models.SET_NULL, null=True, blank=True)
 
     def __str__(self):
         return self.calendly_uuid
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.invitee_id is None:
+            self.link_invitee()
+        super(BookingCalendlyData, self).save(*args, **kwargs)
+
+    def link_invitee(self):
+        self.invitee = None
+        if self.booking.email_normalized:
+            self.invitee = Invitee.objects.filter(email_normalized=self.booking.email_normalized).first()
+
     def calendly_cancel(self, cancel_reason="", canceled_by=None):
         if canceled_by == None:
             canceled_by = User.objects.get(id=config.APPROVAL_USER_ID).username
@@ -150,7 +384,7 @@ class BookingCalendlyData(models.Model):
             data=json.dumps({"cancellation":{"cancel_reason": cancel_reason, "canceled_by": canceled_by}}).encode(),
             method='PUT', headers={"Accept": "application/json", "Content-Type": "application/json"},)
 
-        with urllib.request.urlopen(req) as f:
+        with urllib.request.urlopen(req, timeout=settings.CALENDLY_API_TIMEOUT) as f:
             if f.status == 200:
                 return True
             else:
@@ -160,22 +394,471 @@ class BookingCalendlyData(models.Model):
         # 1 - find group
         if not self.booking.email:
             return
-        try:
-            invitee = Invitee.objects.get(email=self.booking.email)
+        invitee = self.invitee
+        if invitee:
             # 2 - execute by group if it exists
             if invitee.group:
-                approved, declined = invitee.group.get_approval_executor(self.booking.event_type_id)
-                invitee.group.execute_approval(approved, declined)
-        except ObjectDoesNotExist:
+                if config.APPROVAL_DEBOUNCE_SECONDS > 0:
+                    # bookings of a group coming in a burst get approved together
+                    PendingApproval.objects.mark(invitee.group, self.booking.event_type_id)
+                else:
+                    invitee.group.run_approval(self.booking.event_type_id)
+        else:
             # Assume no group
             if config.APPROVAL_NO_GROUP_ACTION == ApprovalGroup.APPROVAL_TYPE_DECLINE:
                 if self.booking.approval_status != Booking.APPROVAL_STATUS_DECLINED:
+                    ApprovalEvent.objects.create(booking_id=self.booking.pk, run_id=uuid.uuid4(),
+                        old_status=self.booking.approval_status, new_status=Booking.APPROVAL_STATUS_DECLINED)
                     self.booking.approval_status = Booking.APPROVAL_STATUS_DECLINED
                     self.booking.save()
-                    LogEntry.objects.log_action(
-                                    user_id=config.APPROVAL_USER_ID,
-                                    content_type_id=ContentType.objects.get_for_model(self.booking).pk,
-                                    object_id=self.booking.pk,
-                                    object_repr=str(self.booking),
-                                    change_message="Declined (no group)",
-                                    action_flag=CHANGE)
+                    ReportChange.objects.record(self.booking.event_type_id, [None])
+
+
+class ApprovalEvent(models.Model):
+    """
+    Append-only log of approval status changes made by the system, human
+    changes stay in the admin LogEntry. Bookings and groups are referenced
+    without constraints so the log outlives them
+    """
+    booking = models.ForeignKey(Booking, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, related_name='+')
+    group = models.ForeignKey(ApprovalGroup, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='+')
+    old_status = models.CharField(max_length=16, choices=Booking.APPROVAL_STATUS_CHOICES)
+    new_status = models.CharField(max_length=16, choices=Booking.APPROVAL_STATUS_CHOICES)
+    run_id = models.UUIDField(db_index=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ["-id"]
+
+    def __str__(self):
+        return 'Approval event #'+str(self.id)
+
+
+class ReportChangeManager(models.Manager):
+    def record(self, event_type_id, group_ids):
+        pending = getattr(_collected_changes, 'pending', None)
+        if pending is not None:
+            pending.update((event_type_id, group_id) for group_id in group_ids)
+            return
+        self.bulk_create([
+            self.model(event_type_id=event_type_id, group_id=group_id) for group_id in group_ids
+        ])
+
+    @contextmanager
+    def collect(self):
+        """
+        Record the changes made within once, when leaving, so a request saving
+        several rows adds a row per changed group of each event type only
+        """
+        if getattr(_collected_changes, 'pending', None) is not None:
+            yield
+            return
+        _collected_changes.pending = set()
+        try:
+            yield
+        finally:
+            self.flush()
+            _collected_changes.pending = None
+
+    def flush(self):
+        """
+        Write changes collected so far, a change of no group in particular is
+        left out when the event type has changed groups anyway
+        """
+        pending = getattr(_collected_changes, 'pending', None)
+        if not pending:
+            return
+        changed_groups = {event_type_id for event_type_id, group_id in pending if group_id is not None}
+        self.bulk_create([
+            self.model(event_type_id=event_type_id, group_id=group_id)
+            for event_type_id, group_id in sorted(pending, key=str)
+            if group_id is not None or event_type_id not in changed_groups
+        ])
+        pending.clear()
+
+    def latest_version(self):
+        # versions decide what is cached, so they include collected changes
+        self.flush()
+        return self.aggregate(version=Max('id'))['version'] or 0
+
+    def oldest_version(self):
+        """
+        @return the version changes are kept since, clients behind it may have
+        missed trimmed ones
+        """
+        oldest = self.aggregate(version=Min('id'))['version']
+        return oldest - 1 if oldest else 0
+
+    def trim(self, before):
+        """
+        Delete changes made before the given time, but the latest one, which
+        carries the current version
+        @return number of changes deleted
+        """
+        deleted, _ = self.filter(created_at__lt=before, id__lt=self.latest_version()).delete()
+        return deleted
+
+
+class ReportChange(models.Model):
+    """
+    Append-only feed of report changes; the id is the monotonic report version
+    """
+    objects = ReportChangeManager()
+
+    event_type_id = models.CharField(max_length=32, default='', db_index=True)
+    group = models.ForeignKey(ApprovalGroup, on_delete=models.CASCADE, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return 'Change #'+str(self.id)
+
+
+class EventTypeManager(models.Manager):
+    # counts of current bookings by approval status, cancelled ones apart
+    STATUS_COUNT_FIELDS = {
+        Booking.APPROVAL_STATUS_NEW: 'new_count',
+        Booking.APPROVAL_STATUS_APPROVED: 'approved_count',
+        Booking.APPROVAL_STATUS_DECLINED: 'declined_count',
+    }
+
+    def refresh(self, event_type_id, name=None):
+        """
+        Recount the bookings of an event type, to backfill or repair counts,
+        name comes from Calendly payloads and is kept when not given
+        """
+        values = Booking.all_objects.filter(event_type_id=event_type_id).aggregate(
+            new_count=Count('id', filter=Q(cancelled_at=None, approval_status=Booking.APPROVAL_STATUS_NEW)),
+            approved_count=Count('id', filter=Q(cancelled_at=None, approval_status=Booking.APPROVAL_STATUS_APPROVED)),
+            declined_count=Count('id', filter=Q(cancelled_at=None, approval_status=Booking.APPROVAL_STATUS_DECLINED)),
+            cancelled_count=Count('id', filter=~Q(cancelled_at=None)),
+            first_spot=Min('spot_start'),
+            last_spot=Max('spot_start'),
+        )
+        if name is not None:
+            values['name'] = name
+        return self.update_or_create(event_type_id=event_type_id, defaults=values)[0]
+
+    def add(self, event_type_id, counts, spot_start=None):
+        """
+        Move booking counts of an event type in a statement instead of
+        recounting, an event type not counted yet is counted whole
+        @param counts dict of count field and amount to add
+        @param spot_start a spot to widen first_spot and last_spot to
+        """
+        values = {
+            name: Greatest(F(name) + amount, 0, output_field=models.PositiveIntegerField())
+            for name, amount in counts.items() if amount
+        }
+        if spot_start is not None:
+            spot = Value(spot_start, output_field=models.DateTimeField())
+            values['first_spot'] = Least(Coalesce('first_spot', spot), spot)
+            values['last_spot'] = Greatest(Coalesce('last_spot', spot), spot)
+        if values and not self.filter(event_type_id=event_type_id).update(**values):
+            self.refresh(event_type_id)
+
+    def count_field(self, counted):
+        event_type_id, approval_status, cancelled = counted
+        return 'cancelled_count' if cancelled else self.STATUS_COUNT_FIELDS[approval_status]
+
+    def count_booking(self, before, after, spot_start=None):
+        """
+        Move a booking from the counts it was under to the ones it is under now
+        @param before, after (event_type_id, approval_status, cancelled) as
+        Booking.get_stored() returns, None for a booking created or deleted
+        @param spot_start widens the spots of the event type it is under now
+        """
+        deltas = defaultdict(Counter)
+        if before:
+            deltas[before[0]][self.count_field(before)] -= 1
+        if after:
+            deltas[after[0]][self.count_field(after)] += 1
+        for event_type_id, counts in deltas.items():
+            self.add(event_type_id, counts, spot_start if after and after[0] == event_type_id else None)
+
+    def count_transitions(self, event_type_id, transitions):
+        """
+        @param transitions list of (old status, new status) of current bookings
+        """
+        counts = Counter()
+        for old_status, new_status in transitions:
+            counts[self.STATUS_COUNT_FIELDS[old_status]] -= 1
+            counts[self.STATUS_COUNT_FIELDS[new_status]] += 1
+        self.add(event_type_id, counts)
+
+
+class EventType(models.Model):
+    """
+    Booking counts of an event type, moved along with every booking change
+    so the admin never recounts
+    """
+    objects = EventTypeManager()
+
+    event_type_id = models.CharField(max_length=32, primary_key=True)
+    name = models.CharField(max_length=255, blank=True)
+    new_count = models.PositiveIntegerField(default=0)
+    approved_count = models.PositiveIntegerField(default=0)
+    declined_count = models.PositiveIntegerField(default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+    first_spot = models.DateTimeField(null=True, blank=True)
+    last_spot = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ["-last_spot"]
+
+    def __str__(self):
+        return self.name or self.event_type_id
+
+    @property
+    def total(self):
+        return self.new_count + self.approved_count + self.declined_count
+
+
+class PendingApprovalManager(models.Manager):
+    def mark(self, group, event_type_id):
+        fastpath.insert_ignore(self.model, [self.model(group=group, event_type_id=event_type_id)],
+            unique=('group', 'event_type_id'))
+
+    def run_due(self, debounce=None):
+        """
+        Run approval once for every group marked at least debounce seconds ago
+        @return number of approval runs
+        """
+        if debounce is None:
+            debounce = config.APPROVAL_DEBOUNCE_SECONDS
+        due = self.filter(
+            requested_at__lte=timezone.now() - timedelta(seconds=debounce)
+        ).select_related('group').order_by('requested_at')
+
+        runs = 0
+        for pending in due:
+            # claim it first, so concurrent workers skip it, while bookings
+            # arriving during the run mark the group again
+            deleted, _ = self.filter(pk=pending.pk).delete()
+            if not deleted:
+                continue
+            try:
+                pending.group.run_approval(pending.event_type_id)
+            except Exception:
+                # marked again, to be retried once the window has passed
+                logger.exception('Approval of %s failed', pending)
+                self.mark(pending.group, pending.event_type_id)
+                continue
+            runs += 1
+        return runs
+
+
+class PendingApproval(models.Model):
+    """
+    Groups waiting for a debounced approval run
+    """
+    objects = PendingApprovalManager()
+
+    group = models.ForeignKey(ApprovalGroup, on_delete=models.CASCADE)
+    event_type_id = models.CharField(max_length=32, default='')
+    requested_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        unique_together = [['group', 'event_type_id']]
+
+    def __str__(self):
+        return '{} ({})'.format(self.group, self.event_type_id)
+
+
+class SweepWatermark(models.Model):
+    """
+    Time the last successful approval sweep of an event type covered
+    changes up to
+    """
+    event_type_id = models.CharField(max_length=32, primary_key=True)
+    until = models.DateTimeField()
+
+    def __str__(self):
+        return '{} ({})'.format(self.event_type_id, self.until)
+
+
+class JobManager(models.Manager):
+    def enqueue(self, name, user=None, **kwargs):
+        return self.create(name=name, kwargs=kwargs, user=user)
+
+    def claim(self):
+        """
+        Take the oldest queued job, concurrent workers skip jobs being claimed
+        @return Job or None
+        """
+        with transaction.atomic():
+            queued = self.filter(status=Job.STATUS_QUEUED).order_by('created_at')
+            if connection.features.has_select_for_update_skip_locked:
+                queued = queued.select_for_update(skip_locked=True)
+            job = queued.first()
+            if job:
+                job.status = Job.STATUS_RUNNING
+                job.started_at = timezone.now()
+                job.save(update_fields=['status', 'started_at'])
+        return job
+
+    def fail_stale(self, timeout):
+        """
+        Jobs left running by a worker that stopped (a restart, a crash) would
+        show as running forever
+        @param timeout seconds after which a running job counts as stopped
+        @return number of jobs marked failed
+        """
+        now = timezone.now()
+        return self.filter(status=Job.STATUS_RUNNING, started_at__lt=now - timedelta(seconds=timeout)).update(
+            status=Job.STATUS_FAILED, finished_at=now, result='Stopped running, the worker quit or timed out.')
+
+    def run_next(self):
+        job = self.claim()
+        if job:
+            job.run()
+        return job
+
+    def run_now(self, name, user=None, **kwargs):
+        """
+        Run a job in this process, still recorded like queued ones
+        """
+        job = self.create(name=name, kwargs=kwargs, user=user,
+            status=Job.STATUS_RUNNING, started_at=timezone.now())
+        job.run()
+        return job
+
+
+class Job(models.Model):
+    """
+    Long admin actions, run by the run_jobs worker outside of the request
+    """
+    objects = JobManager()
+
+    STATUS_QUEUED = 'QUEUED'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_DONE = 'DONE'
+    STATUS_FAILED = 'FAILED'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=64)
+    kwargs = JSONField(default=dict)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(default=STATUS_QUEUED, max_length=16, choices=STATUS_CHOICES, db_index=True)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    result = models.TextField(blank=True)
+    output = models.TextField(blank=True)
+    output_name = models.CharField(max_length=128, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return '{} #{}'.format(self.name, self.id)
+
+    def set_progress(self, progress, total=None):
+        self.progress = progress
+        if total is not None:
+            self.total = total
+        Job.objects.filter(pk=self.pk).update(progress=self.progress, total=self.total)
+
+    def run(self):
+        from .jobs import JOBS
+        try:
+            self.result = JOBS[self.name](self, **self.kwargs) or ''
+            self.status = Job.STATUS_DONE
+        except Exception as e:
+            self.result = str(e)
+            self.status = Job.STATUS_FAILED
+        self.finished_at = timezone.now()
+        self.save()
+
+
+def copy_rows(queryset, model, **values):
+    """
+    INSERT ... SELECT the rows of queryset into the table of model, for the
+    columns both have, plus constant values for others
+    """
+    source_fields = {f.attname for f in queryset.model._meta.concrete_fields}
+    fields = [f for f in model._meta.concrete_fields if f.attname in source_fields or f.attname in values]
+    queryset = queryset.order_by().annotate(**{
+        '_'+name: models.Value(value, output_field=model._meta.get_field(name)) for name, value in values.items()
+    }).values_list(*[f.attname if f.attname in source_fields else '_'+f.attname for f in fields])
+    select, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('INSERT INTO {} ({}) {}'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(f.column) for f in fields),
+            select), params)
+        return cursor.rowcount
+
+
+class ArchivedBookingCalendlyDataManager(models.Manager):
+    def archive(self, event_type_id, batch_size=1000):
+        """
+        Move bookings of an event type to the archive tables, in batches so
+        locks stay short
+        @return number of bookings moved
+        """
+        return self._move(event_type_id, Booking, BookingCalendlyData, ArchivedBooking, self.model,
+            batch_size, archived_at=timezone.now())
+
+    def restore(self, event_type_id, batch_size=1000):
+        """
+        @return number of bookings moved back from the archive
+        """
+        # groups and invitees deleted meanwhile would break constraints
+        archived = self.filter(booking__event_type_id=event_type_id)
+        archived.exclude(approval_group=None).exclude(
+            approval_group__in=ApprovalGroup.objects.values('pk')).update(approval_group=None)
+        archived.exclude(invitee=None).exclude(
+            invitee__in=Invitee.objects.values('pk')).update(invitee=None)
+        return self._move(event_type_id, ArchivedBooking, self.model, Booking, BookingCalendlyData,
+            batch_size)
+
+    def _move(self, event_type_id, booking_model, data_model, to_booking_model, to_data_model,
+              batch_size, **values):
+        bookings = booking_model._base_manager.filter(event_type_id=event_type_id)
+        moved = 0
+        while True:
+            with transaction.atomic():
+                pks = list(bookings.order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if not pks:
+                    break
+                copy_rows(booking_model._base_manager.filter(pk__in=pks), to_booking_model, **values)
+                copy_rows(data_model._base_manager.filter(booking__in=pks), to_data_model)
+                # rows are copied as they are, so skip delete signals and
+                # cascades collecting them one by one
+                data_model._base_manager.filter(booking__in=pks)._raw_delete(self.db)
+                booking_model._base_manager.filter(pk__in=pks)._raw_delete(self.db)
+                moved += len(pks)
+        if moved:
+            ReportChange.objects.record(event_type_id, [None])
+            EventType.objects.refresh(event_type_id)
+        return moved
+
+
+class ArchivedBookingCalendlyData(CompressedPayloadMixin, models.Model):
+    """
+    Calendly data of archived bookings, groups and invitees are referenced
+    without constraints so they can go away meanwhile
+    """
+    objects = ArchivedBookingCalendlyDataManager()
+
+    booking = models.OneToOneField(ArchivedBooking, on_delete=models.CASCADE, related_name='calendly_data')
+    payload = JSONField(default=dict)
+    payload_zlib = models.BinaryField(null=True, blank=True, editable=False)
+    payload_trimmed = models.BooleanField(default=False)
+    calendly_uuid = models.CharField(primary_key=True, max_length=32)
+    approval_group = models.ForeignKey(ApprovalGroup, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='+')
+    invitee = models.ForeignKey(Invitee, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='+')
+
+    def __str__(self):
+        return self.calendly_uuid
@@ -0,0 +1,84 @@
+"""
+Report reads from an optional read replica (the "replica" database). Only
+code running under replica_reads() is routed there, and a session that
+wrote something reads the primary for REPLICA_STALENESS_SECONDS after, so
+people see their own changes while the replica catches up
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from contextlib import contextmanager
+from functools import wraps
+import threading
+import time
+
+REPLICA_DB_ALIAS = 'replica'
+REPLICA_APP_LABELS = {'bookings', 'webhook_calendly'}
+STALE_UNTIL_SESSION_KEY = '_replica_stale_until'
+
+_state = threading.local()
+
+
+@contextmanager
+def replica_reads():
+    previous = getattr(_state, 'replica', False)
+    _state.replica = REPLICA_DB_ALIAS in settings.DATABASES
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def use_replica(view):
+    """
+    Read bookings and groups of the view from the replica, unless the
+    session of the request wrote recently
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        # anonymous visitors have no session to look at
+        session = getattr(request, 'session', None)
+        if (session is not None and settings.SESSION_COOKIE_NAME in request.COOKIES
+                and session.get(STALE_UNTIL_SESSION_KEY, 0) > time.time()):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        if not getattr(_state, 'replica', False) or model._meta.app_label not in REPLICA_APP_LABELS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # read-modify-write within a transaction stays on the primary
+            return None
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB_ALIAS
+
+
+class ReplicaStalenessMiddleware(object):
+    """
+    Marks sessions that wrote, for use_replica to read the primary a while
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        # only sessions there are, webhooks should not start one
+        if session is not None and session.session_key and (
+                _state.wrote or request.method not in ('GET', 'HEAD', 'OPTIONS')):
+            session[STALE_UNTIL_SESSION_KEY] = time.time() + settings.REPLICA_STALENESS_SECONDS
+        return response
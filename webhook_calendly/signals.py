@@ -0,0 +1,65 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from bookings.models import Booking, CancelledBooking
+from .models import ApprovalGroup, Invitee, ReportChange, EventType
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=CancelledBooking)
+@receiver(post_delete, sender=CancelledBooking)
+def booking_changed(sender, instance, **kwargs):
+    # moves the report version, so cached report data is not reused
+    ReportChange.objects.record(instance.event_type_id, [None])
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=CancelledBooking)
+def booking_saved(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_stored', None)
+    current = instance.get_stored()
+    if created:
+        EventType.objects.count_booking(None, current, spot_start=instance.spot_start)
+    elif stored is None or current is None:
+        # loaded without the fields counts depend on
+        EventType.objects.refresh(instance.event_type_id)
+    elif stored != current:
+        EventType.objects.count_booking(stored, current)
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=CancelledBooking)
+def booking_deleted(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored', None) or instance.get_stored()
+    if stored is None:
+        EventType.objects.refresh(instance.event_type_id)
+    else:
+        EventType.objects.count_booking(stored, None)
+
+
+@receiver(post_save, sender=ApprovalGroup)
+@receiver(post_delete, sender=ApprovalGroup)
+def group_changed(sender, instance, **kwargs):
+    # membership and approval type matter to every event type
+    ReportChange.objects.record('', [None])
+
+
+@receiver(post_save, sender=Invitee)
+def invitee_saved(sender, instance, created, **kwargs):
+    # covers admin edits and imports, saves changing neither the email nor
+    # the group cost nothing more
+    stored_email, stored_group_id = getattr(instance, '_stored', (None, None))
+    if created or (stored_email, stored_group_id) != (instance.email_normalized, instance.group_id):
+        # the group left too, for sweeps to re-approve it, invitees of no
+        # group are in no report row
+        ReportChange.objects.record('', {stored_group_id, instance.group_id} - {None})
+    if created or stored_email != instance.email_normalized:
+        # nothing points at a new invitee yet
+        instance.link_bookings(unlink=not created)
+
+
+@receiver(post_delete, sender=Invitee)
+def invitee_deleted(sender, instance, **kwargs):
+    if instance.group_id:
+        ReportChange.objects.record('', [instance.group_id])
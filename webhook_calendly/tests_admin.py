@@ -1,8 +1,8 @@
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, RequestFactory, override_settings
 from django.urls import reverse
 from django.db.models import QuerySet
-from django.contrib.auth.models import User
-from django.contrib.admin.models import LogEntry, CHANGE
+from django.contrib.auth.models import User, Permission
+from django.core.exceptions import PermissionDenied
 from django.contrib.admin import ModelAdmin, AdminSite
 from django.contrib.messages.storage.fallback import FallbackStorage
 from copy import copy
@@ -10,7 +10,7 @@ from constance import config
 from unittest.mock import Mock, patch
 
 from bookings.models import Booking, CancelledBooking
-from .models import ApprovalGroup, Invitee, BookingCalendlyData
+from .models import ApprovalGroup, Invitee, BookingCalendlyData, ApprovalEvent
 from .admin_decorators import admin_link
 from .admin import GroupAdmin, InviteeAdmin, CancelledBookingCalendlyInline
 
@@ -123,20 +123,39 @@ class CalendlyAdminTests(TestCase):
         )
         self.assertTrue('2' in request._test_message)
 
-        self.assertEqual(LogEntry.objects.filter(
-            user_id=self.user.id,
-            action_flag=CHANGE
-        ).count(), 2)
+        self.assertEqual(ApprovalEvent.objects.count(), 2)
 
-    def test_preview_approval(self):
-        request = self.factory.post(reverse('admin:webhook_calendly_approvalgroup_changelist'))
+    def test_approval_events(self):
+        ag = ApprovalGroup.objects.get()
+        ag.run_approval("2")
+        run_id = ApprovalEvent.objects.first().run_id
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:webhook_calendly_approvalevent_changelist'), {'q': run_id})
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+        self.assertContains(response, reverse('admin:webhook_calendly_approvalgroup_change', args=(ag.pk,)))
+
+        url = reverse('admin:webhook_calendly_approvalevent_changelist')
+        booking_id = ApprovalEvent.objects.first().booking_id
+        response = self.client.get(url, {'q': ' {} '.format(booking_id)})
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+        for q in ('not-a-run', '12ab', str(run_id)[:8]):
+            response = self.client.get(url, {'q': q})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['cl'].result_list), 0)
+
+    def _preview_request(self, data=None):
+        request = self.factory.post(reverse('admin:webhook_calendly_approvalgroup_changelist'), data or {})
         request.user = self.user
         setattr(request, 'session', {})
         setattr(request, '_messages', FallbackStorage(request))
+        return request
+
+    def test_preview_approval(self):
+        request = self._preview_request()
         queryset = ApprovalGroup.objects.all()
         ma = GroupAdmin(ApprovalGroup, self.site)
         ma.message_user = _message_user
-        ma.preview_approval(request, queryset)
+        response = ma.preview_approval(request, queryset)
         bookings = Booking.objects.filter(event_type_id="2").order_by('booked_at')
         self.assertEqual(bookings[0].approval_status, Booking.APPROVAL_STATUS_DECLINED)
         self.assertEqual(bookings[1].approval_status, Booking.APPROVAL_STATUS_NEW)
@@ -144,12 +163,79 @@ class CalendlyAdminTests(TestCase):
             BookingCalendlyData.objects.get(calendly_uuid="1",).booking.approval_status,
             Booking.APPROVAL_STATUS_NEW
         )
-        self.assertTrue('2' in request._test_message)
+        self.assertEqual(response.context_data['changes_count'], 2)
+        self.assertEqual(response.context_data['transitions'], [
+            ((Booking.APPROVAL_STATUS_DECLINED, Booking.APPROVAL_STATUS_APPROVED), 1),
+            ((Booking.APPROVAL_STATUS_NEW, Booking.APPROVAL_STATUS_DECLINED), 1),
+        ])
+        self.assertEqual(response.context_data['groups'], [("Group 1", 2)])
+        self.assertEqual(len(response.context_data['rows']), 2)
+        response.render()
+        self.assertTrue(b'Previewing 2 approval' in response.content)
+        self.assertTrue(b'name="apply"' in response.content)
 
-        self.assertEqual(LogEntry.objects.filter(
-            user_id=self.user.id,
-            action_flag=CHANGE
-        ).count(), 0)
+        self.assertEqual(ApprovalEvent.objects.count(), 0)
+
+    def test_preview_approval_page(self):
+        ma = GroupAdmin(ApprovalGroup, self.site)
+        ma.list_per_page = 1
+        response = ma.preview_approval(self._preview_request(), ApprovalGroup.objects.all())
+        signed = response.context_data['signed_diff']
+        self.assertEqual(len(response.context_data['rows']), 1)
+
+        response = ma.preview_approval(self._preview_request({'diff': signed, 'page': 2}), ApprovalGroup.objects.none())
+        self.assertEqual(response.context_data['page'].number, 2)
+        self.assertEqual(response.context_data['changes_count'], 2)
+
+    def test_preview_approval_apply(self):
+        ma = GroupAdmin(ApprovalGroup, self.site)
+        ma.message_user = _message_user
+        signed = ma.preview_approval(self._preview_request(), ApprovalGroup.objects.all()).context_data['signed_diff']
+
+        # changed since the preview, so left alone
+        b = Booking.objects.get(calendly_data__calendly_uuid="3")
+        b.approval_status = Booking.APPROVAL_STATUS_DECLINED
+        b.save()
+
+        request = self._preview_request({'diff': signed, 'apply': '1'})
+        self.assertEqual(ma.preview_approval(request, ApprovalGroup.objects.all()), None)
+        bookings = Booking.objects.filter(event_type_id="2").order_by('booked_at')
+        self.assertEqual(bookings[0].approval_status, Booking.APPROVAL_STATUS_APPROVED)
+        self.assertEqual(bookings[0].calendly_data.approval_group.name, "Group 1")
+        self.assertEqual(bookings[1].approval_status, Booking.APPROVAL_STATUS_DECLINED)
+        self.assertTrue('Updated 1 approval' in request._test_message)
+        self.assertTrue('Skipped 1' in request._test_message)
+
+        self.assertEqual(ApprovalEvent.objects.count(), 1)
+
+    def test_preview_approval_tampered(self):
+        ma = GroupAdmin(ApprovalGroup, self.site)
+        ma.message_user = _message_user
+        request = self._preview_request({'diff': 'nope', 'apply': '1'})
+        ma.preview_approval(request, ApprovalGroup.objects.all())
+        self.assertTrue('altered' in request._test_message)
+        self.assertEqual(Booking.objects.filter(approval_status=Booking.APPROVAL_STATUS_APPROVED).count(), 0)
+
+    def test_preview_approval_view_only(self):
+        ma = GroupAdmin(ApprovalGroup, self.site)
+        viewer = User.objects.create_user('viewer', 'viewer@localhost', 'viewer', is_staff=True)
+        viewer.user_permissions.add(Permission.objects.get(codename='view_approvalgroup'))
+        viewer = User.objects.get(pk=viewer.pk)
+
+        request = self._preview_request()
+        request.user = viewer
+        response = ma.preview_approval(request, ApprovalGroup.objects.all())
+        self.assertFalse(response.context_data['can_apply'])
+        response.render()
+        self.assertFalse(b'name="apply"' in response.content)
+
+        for data in ({'apply': '1'}, {'diff': response.context_data['signed_diff'], 'apply': '1'}):
+            request = self._preview_request(data)
+            request.user = viewer
+            with self.assertRaises(PermissionDenied):
+                ma.preview_approval(request, ApprovalGroup.objects.all())
+        self.assertEqual(Booking.objects.filter(approval_status=Booking.APPROVAL_STATUS_APPROVED).count(), 0)
+        self.assertEqual(ApprovalEvent.objects.count(), 0)
 
     def test_admin_actions_fail(self):
         methods = ['execute_approval', 'preview_approval']
@@ -160,11 +246,13 @@ class CalendlyAdminTests(TestCase):
             setattr(request, '_messages', FallbackStorage(request))
             grp = Mock()
             grp.get_approval_executor = Mock(side_effect=Exception('Boom!'))
+            grp.run_approval = Mock(side_effect=Exception('Boom!'))
             queryset = [grp]
             ma = GroupAdmin(ApprovalGroup, self.site)
             ma.message_user = _message_user
             func = getattr(ma, func_name)
-            func(request, queryset)
+            with patch.object(ApprovalGroup.objects, 'approval_diff', side_effect=Exception('Boom!')):
+                func(request, queryset)
             self.assertTrue('Boom!' in request._test_message, "{} does not include exception message".format(func_name))
 
             with patch(__package__+'.admin.get_default_event_type_id', return_value=None) as urlopen:
@@ -199,3 +287,10 @@ class CancelledBookingCalendlyInlineTests(TestCase):
         ma = CancelledBookingCalendlyInline(CancelledBooking, self.site)
         self.assertEqual(ma.has_add_permission(request), False)
         self.assertEqual(ma.has_change_permission(request), False)
+
+
+@override_settings(DATABASE_FAST_PATHS=False)
+class CalendlyAdminFallbackTests(CalendlyAdminTests):
+    """
+    Same admin actions through the portable queries other backends get
+    """
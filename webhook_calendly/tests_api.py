@@ -0,0 +1,112 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.core.cache import cache
+from constance import config
+
+from bookings.models import Booking
+from .models import ApprovalGroup, BookingCalendlyData, ReportChange
+
+
+class ReportAPITests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        config.DEFAULT_EVENT_TYPE_ID = "1"
+        config.SHOW_DECLINED_COUNT_FRONTEND = True
+
+        for i in range(1, 12):
+            ag = ApprovalGroup.objects.create(name="Group {}".format(i))
+            BookingCalendlyData.objects.create(
+                calendly_uuid=str(i),
+                approval_group=ag,
+                booking=Booking.objects.create(
+                    event_type_id="1",
+                    spot_start="2019-01-01 14:{}:00-0400".format(i + 10),
+                    spot_end="2019-01-01 14:{}:00-0400".format(i + 20),
+                    approval_status=Booking.APPROVAL_STATUS_APPROVED,
+                ),
+            )
+        BookingCalendlyData.objects.create(
+            calendly_uuid="dup",
+            approval_group=ag,
+            booking=Booking.objects.create(
+                event_type_id="1",
+                spot_start="2019-01-01 16:00:00-0400",
+                spot_end="2019-01-01 16:10:00-0400",
+                approval_status=Booking.APPROVAL_STATUS_DECLINED,
+            ),
+        )
+
+    def test_groups(self):
+        response = self.client.get(reverse('api_groups'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['event_type_id'], "1")
+        self.assertEqual(data['declined_bookings_count'], 1)
+        self.assertEqual(len(data['results']), 11)
+        self.assertEqual(data['results'][1]['name'], "Group 2") # natural sorted
+        self.assertTrue(data['results'][-1]['dup_booking'])
+        self.assertIsNone(data['next'])
+
+    def test_cursor(self):
+        response = self.client.get(reverse('api_groups'), {'limit': 5})
+        data = response.json()
+        self.assertEqual([g['name'] for g in data['results']], ["Group {}".format(i) for i in range(1, 6)])
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([g['name'] for g in data['results']], ["Group {}".format(i) for i in range(6, 11)])
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([g['name'] for g in data['results']], ["Group 11"])
+        self.assertIsNone(data['next'])
+
+    def test_cursor_same_names(self):
+        # natural sorting ignores case, so the cursor goes on by group id
+        for name in ("group 1", "GROUP 1"):
+            ag = ApprovalGroup.objects.create(name=name)
+            BookingCalendlyData.objects.create(
+                calendly_uuid=name,
+                approval_group=ag,
+                booking=Booking.objects.create(
+                    event_type_id="1",
+                    spot_start="2019-01-01 17:00:00-0400",
+                    spot_end="2019-01-01 17:10:00-0400",
+                    approval_status=Booking.APPROVAL_STATUS_APPROVED,
+                ),
+            )
+        names = []
+        data = self.client.get(reverse('api_bookings'), {'limit': 1}).json()
+        while True:
+            names += [b['group'] for b in data['results']]
+            if not data['next']:
+                break
+            data = self.client.get(data['next']).json()
+        self.assertEqual(names[:3], ["Group 1", "group 1", "GROUP 1"])
+        self.assertEqual(len(names), 13)
+
+    def test_bad_params(self):
+        self.assertEqual(self.client.get(reverse('api_groups'), {'limit': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_groups'), {'cursor': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_bookings'), {'fields': 'email'}).status_code, 400)
+
+    def test_fields(self):
+        response = self.client.get(reverse('api_bookings'), {'fields': 'group,spot_start'})
+        data = response.json()
+        self.assertEqual(len(data['results']), 11)
+        self.assertEqual(set(data['results'][0].keys()), {'group', 'spot_start'})
+
+    def test_gzip(self):
+        response = self.client.get(reverse('api_bookings'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_snapshot_version(self):
+        data = self.client.get(reverse('api_groups')).json()
+        Booking.objects.filter(approval_status=Booking.APPROVAL_STATUS_DECLINED).update(
+            approval_status=Booking.APPROVAL_STATUS_NEW)
+        # served from the snapshot until the report version moves
+        self.assertEqual(self.client.get(reverse('api_groups')).json(), data)
+
+        ReportChange.objects.record("1", [None])
+        data = self.client.get(reverse('api_groups')).json()
+        self.assertEqual(data['declined_bookings_count'], 0)
+        self.assertFalse(data['results'][-1]['dup_booking'])
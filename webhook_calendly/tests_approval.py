@@ -1,14 +1,24 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.db import connection, transaction, IntegrityError
+from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.contrib.admin.models import LogEntry
 from constance import config
+from django.core.management import call_command
+from django.core.cache import cache
+from unittest.mock import patch
+from io import StringIO
+from tablib import Dataset
+import threading
 
 from bookings.models import Booking
-from .models import ApprovalGroup, Invitee, BookingCalendlyData
+from .models import ApprovalGroup, Invitee, BookingCalendlyData, ReportChange, PendingApproval, ApprovalEvent, _local_group_locks
+from .admin import InviteeIEResource
 
 
 class ApprovalTests(TestCase):
     def setUp(self):
+        cache.clear()
         user = User.objects.create_superuser('approval', 'approval@localhost', 'approval')
         config.APPROVAL_USER_ID = user.pk
 
@@ -146,6 +156,45 @@ class ApprovalTests(TestCase):
         self.assertEqual(len(bookings_declined), 2)
         self.assertEqual(set(bookings_declined), set([bc2.booking, bc3.booking]))
 
+    def test_approval_diff(self):
+        ag1 = ApprovalGroup.objects.get(name="Group 1")
+        ag2 = ApprovalGroup.objects.get(name="Group 2")
+        bc5 = BookingCalendlyData.objects.create(
+            calendly_uuid="5",
+            booking=Booking.objects.create(
+                email="a@localhost",
+                event_type_id="2",
+                spot_start="2019-01-01 15:40:00-0400",
+                spot_end="2019-01-01 15:50:00-0400",
+            ),
+        )
+        Invitee.objects.create(email="aa@localhost", group=ag1)
+        bc6 = BookingCalendlyData.objects.create(
+            calendly_uuid="6",
+            booking=Booking.objects.create(
+                email="aa@localhost",
+                event_type_id="2",
+                spot_start="2019-01-01 16:40:00-0400",
+                spot_end="2019-01-01 16:50:00-0400",
+                approval_status=Booking.APPROVAL_STATUS_DECLINED,
+            ),
+        )
+        # declined already, left out of the diff
+        with self.assertNumQueries(1):
+            diff = ApprovalGroup.objects.approval_diff("2", [ag1, ag2])
+        bc2 = BookingCalendlyData.objects.get(calendly_uuid="2")
+        self.assertEqual(diff, [
+            (bc2.booking.pk, ag1.pk, Booking.APPROVAL_STATUS_DECLINED, Booking.APPROVAL_STATUS_APPROVED),
+            (bc5.booking.pk, ag1.pk, Booking.APPROVAL_STATUS_NEW, Booking.APPROVAL_STATUS_DECLINED),
+        ])
+
+        changed = ApprovalGroup.objects.apply_approval_diff("2", diff)
+        self.assertEqual(set(changed), set([bc2.booking.pk, bc5.booking.pk]))
+        bc6.refresh_from_db()
+        self.assertEqual(bc6.approval_group, ag1)
+        self.assertEqual(ApprovalGroup.objects.approval_diff("2", [ag1, ag2]), [])
+        self.assertTrue(ReportChange.objects.filter(event_type_id="2", group=ag1).exists())
+
     def test_get_approval_executor_declined(self):
         ag = ApprovalGroup.objects.get(name="Group 1")
         ag.approval_type = ApprovalGroup.APPROVAL_TYPE_DECLINE
@@ -178,6 +227,33 @@ class ApprovalTests(TestCase):
         self.assertEqual(len(bookings_approved), 0)
         self.assertEqual(len(bookings_declined), 3)
 
+    def test_get_approval_executor_subquery(self):
+        ag = ApprovalGroup.objects.get(name="Group 1")
+        for i in range(20):
+            Invitee.objects.create(email="a{}@localhost".format(i), group=ag)
+        with self.assertNumQueries(1):
+            # bookings joined through their invitee
+            bookings_approved, bookings_declined = ag.get_approval_executor("2")
+        self.assertEqual(len(bookings_approved), 1)
+
+    def test_get_approval_executor_decides_afresh(self):
+        ag = ApprovalGroup.objects.get(name="Group 1")
+        bookings_approved, bookings_declined = ag.get_approval_executor("2")
+        self.assertEqual(len(bookings_declined), 0)
+
+        Invitee.objects.create(email="aa@localhost", group=ag)
+        bc = BookingCalendlyData.objects.create(
+            calendly_uuid="5",
+            booking=Booking.objects.create(
+                email="aa@localhost",
+                event_type_id="2",
+                spot_start="2019-01-01 15:40:00-0400",
+                spot_end="2019-01-01 15:50:00-0400",
+            ),
+        )
+        bookings_approved, bookings_declined = ag.get_approval_executor("2")
+        self.assertEqual(bookings_declined, [bc.booking])
+
     def _execute_approval_init(self):
         ag = ApprovalGroup.objects.get(name="Group 1")
         Invitee.objects.create(email="aa@localhost", group=ag)
@@ -220,13 +296,17 @@ class ApprovalTests(TestCase):
             self.assertEqual(bc3.booking.approval_status, Booking.APPROVAL_STATUS_NEW)
             self.assertEqual(bc2.approval_group, None)
             self.assertEqual(bc3.approval_group, None)
-            self.assertEqual(LogEntry.objects.all().count(), 0)
+            self.assertEqual(ApprovalEvent.objects.count(), 0)
         else:
             self.assertEqual(bc2.booking.approval_status, Booking.APPROVAL_STATUS_APPROVED)
             self.assertEqual(bc3.booking.approval_status, Booking.APPROVAL_STATUS_DECLINED)
             self.assertEqual(bc2.approval_group, ag)
             self.assertEqual(bc3.approval_group, ag)
-            self.assertEqual(LogEntry.objects.all().count(), 2)
+            self.assertEqual(ApprovalEvent.objects.count(), 2)
+            self.assertEqual(ApprovalEvent.objects.filter(group=ag).values('run_id').distinct().count(), 1)
+            # system decisions stay out of the admin history
+            self.assertEqual(LogEntry.objects.count(), 0)
+            self.assertEqual(ReportChange.objects.filter(event_type_id="2", group=ag).count(), 1)
 
     def test_execute_approval_meta(self):
         "approval_group, approval_status (approved/declined) and log_action, returns changed"
@@ -252,7 +332,7 @@ class ApprovalTests(TestCase):
         self.assertEqual(bc3.booking.approval_status, Booking.APPROVAL_STATUS_NEW)
         self.assertEqual(bc2.approval_group, None)
         self.assertEqual(bc3.approval_group, None)
-        self.assertEqual(LogEntry.objects.all().count(), 0)
+        self.assertEqual(ApprovalEvent.objects.count(), 0)
 
     def test_execute_approval_protected(self):
         "protected is not touched, and returns correct result"
@@ -294,7 +374,7 @@ class ApprovalTests(TestCase):
         self.assertEqual(bc1.approval_group, ag)
         self.assertEqual(bc2.approval_group, ag)
         self.assertEqual(bc3.approval_group, ag)
-        self.assertEqual(LogEntry.objects.all().count(), 3)
+        self.assertEqual(ApprovalEvent.objects.count(), 3)
 
     def test_bc_run_approval_group_bc2(self):
         ag, bc2, bc3 = self._execute_approval_init()
@@ -306,6 +386,186 @@ class ApprovalTests(TestCase):
         bc3.run_approval()
         self._test_run_approval_meta(var=(ag, bc2, bc3,))
 
+    def test_run_approval_unchanged(self):
+        ag = ApprovalGroup.objects.get(name="Group 1")
+        ag.run_approval("2")
+        version = ReportChange.objects.latest_version()
+        self.assertEqual(ag.run_approval("2"), [])
+        self.assertEqual(ReportChange.objects.latest_version(), version)
+
+    def test_group_run_approval(self):
+        ag, bc2, bc3 = self._execute_approval_init()
+        changed = ag.run_approval("2")
+        self.assertEqual(len(changed), 3)
+        self._test_run_approval_meta(var=(ag, bc2, bc3,))
+
+    def test_group_run_approval_in_sql(self):
+        ag, bc2, bc3 = self._execute_approval_init()
+        with patch.object(Booking, 'from_db', side_effect=AssertionError('bookings loaded')):
+            self.assertEqual(len(ag.run_approval("2")), 3)
+        self._test_run_approval_meta(var=(ag, bc2, bc3,))
+
+    def test_group_run_approval_fake(self):
+        ag, bc2, bc3 = self._execute_approval_init()
+        changed = ag.run_approval("2", fake=True)
+        self.assertEqual(len(changed), 3)
+        self.assertEqual(ApprovalEvent.objects.count(), 0)
+
+    def test_group_lock_fallback(self):
+        'Without row locks, one group is locked across threads of the process'
+        ag = ApprovalGroup.objects.get(name="Group 1")
+        ag2 = ApprovalGroup.objects.get(name="Group 2")
+        acquired = {}
+
+        def try_acquire(group):
+            lock = _local_group_locks.setdefault(group.pk, threading.RLock())
+            acquired[group.pk] = lock.acquire(blocking=False)
+            if acquired[group.pk]:
+                lock.release()
+
+        with patch.object(connection.features, 'has_select_for_update', False):
+            with ag.lock():
+                for group in (ag, ag2):
+                    t = threading.Thread(target=try_acquire, args=(group,))
+                    t.start()
+                    t.join()
+        self.assertFalse(acquired[ag.pk])
+        self.assertTrue(acquired[ag2.pk])
+        # released locks are not kept around
+        self.assertNotIn(ag.pk, _local_group_locks)
+
+    def test_bc_run_approval_debounced(self):
+        config.APPROVAL_DEBOUNCE_SECONDS = 60
+        ag, bc2, bc3 = self._execute_approval_init()
+        bc2.run_approval()
+        bc3.run_approval()
+        self.assertEqual(PendingApproval.objects.filter(group=ag, event_type_id="2").count(), 1)
+        bc2.refresh_from_db()
+        self.assertEqual(bc2.booking.approval_status, Booking.APPROVAL_STATUS_NEW)
+
+        # not due yet
+        self.assertEqual(PendingApproval.objects.run_due(), 0)
+        self.assertEqual(PendingApproval.objects.run_due(debounce=0), 1)
+        self.assertEqual(PendingApproval.objects.count(), 0)
+        self._test_run_approval_meta(var=(ag, bc2, bc3,))
+
+    def test_run_due_failed(self):
+        config.APPROVAL_DEBOUNCE_SECONDS = 60
+        ag1 = ApprovalGroup.objects.get(name="Group 1")
+        ag2 = ApprovalGroup.objects.get(name="Group 2")
+        PendingApproval.objects.mark(ag1, "2")
+        PendingApproval.objects.mark(ag2, "1")
+
+        def run_approval(group, event_type_id):
+            if group == ag1:
+                raise Exception('Boom!')
+            return []
+
+        with patch.object(ApprovalGroup, 'run_approval', autospec=True, side_effect=run_approval) as run, \
+                self.assertLogs('webhook_calendly.models', 'ERROR'):
+            self.assertEqual(PendingApproval.objects.run_due(debounce=0), 1)
+        # the other group still ran, the failed one waits for its retry
+        self.assertEqual(run.call_count, 2)
+        self.assertEqual(list(PendingApproval.objects.values_list('group', 'event_type_id')), [(ag1.pk, "2")])
+        self.assertEqual(PendingApproval.objects.run_due(), 0)
+
+    def test_process_approvals_command(self):
+        config.APPROVAL_DEBOUNCE_SECONDS = 0
+        ag, bc2, bc3 = self._execute_approval_init()
+        PendingApproval.objects.mark(ag, "2")
+        out = StringIO()
+        call_command('process_approvals', stdout=out)
+        self.assertTrue('1 group' in out.getvalue())
+        self._test_run_approval_meta(var=(ag, bc2, bc3,))
+
+    def test_bc_linked_invitee(self):
+        bc = BookingCalendlyData.objects.get(calendly_uuid="2")
+        self.assertEqual(bc.invitee, Invitee.objects.get(email="a@localhost"))
+
+    def test_invitee_link_bookings(self):
+        bc = BookingCalendlyData.objects.create(
+            calendly_uuid="10",
+            booking=Booking.objects.create(
+                email="late@localhost",
+                event_type_id="2",
+                spot_start="2019-01-01 14:40:00-0400",
+                spot_end="2019-01-01 14:50:00-0400",
+            ),
+        )
+        self.assertEqual(bc.invitee, None)
+        invitee = Invitee.objects.create(email="late@localhost")
+        bc.refresh_from_db()
+        self.assertEqual(bc.invitee, invitee)
+
+        invitee.email = "changed@localhost"
+        invitee.save()
+        bc.refresh_from_db()
+        self.assertEqual(bc.invitee, None)
+
+    def test_invitee_save_unchanged(self):
+        invitee = Invitee.objects.get(email="a@localhost")
+        with self.assertNumQueries(1):
+            # neither relinked nor recorded as a report change
+            invitee.save()
+        version = ReportChange.objects.latest_version()
+        invitee.group = ApprovalGroup.objects.get(name="Group 2")
+        with self.assertNumQueries(2):
+            invitee.save()
+        self.assertTrue(ReportChange.objects.latest_version() > version)
+
+    def test_invitee_import(self):
+        version = ReportChange.objects.latest_version()
+        dataset = Dataset(headers=['email', 'group'])
+        for i in range(5):
+            dataset.append(['import{}@localhost'.format(i), 'Group 1'])
+
+        result = InviteeIEResource().import_data(dataset, dry_run=True)
+        self.assertFalse(result.has_errors())
+        self.assertEqual(ReportChange.objects.latest_version(), version)
+
+        InviteeIEResource().import_data(dataset)
+        self.assertEqual(Invitee.objects.filter(email__startswith='import').count(), 5)
+        self.assertEqual(ReportChange.objects.filter(id__gt=version).count(), 1)
+
+    def test_invitee_case_variants(self):
+        invitee = Invitee.objects.create(email="Case.Variant@localhost")
+        with self.assertRaises(ValidationError):
+            Invitee(email=" case.variant@LOCALHOST").full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Invitee.objects.create(email="case.variant@localhost")
+        invitee.full_clean()
+
+        dataset = Dataset(headers=['email', 'group'])
+        dataset.append(['CASE.VARIANT@localhost', 'Group 2'])
+        result = InviteeIEResource().import_data(dataset)
+        self.assertFalse(result.has_errors())
+        invitee = Invitee.objects.get(email_normalized='case.variant@localhost')
+        self.assertEqual(invitee.email, 'CASE.VARIANT@localhost')
+        self.assertEqual(invitee.group.name, 'Group 2')
+
+    def test_bc_linked_invitee_case_insensitive(self):
+        invitee = Invitee.objects.create(email="Mixed.Case@localhost")
+        bc = BookingCalendlyData.objects.create(
+            calendly_uuid="10",
+            booking=Booking.objects.create(
+                email="mixed.case@LOCALHOST",
+                event_type_id="2",
+                spot_start="2019-01-01 14:40:00-0400",
+                spot_end="2019-01-01 14:50:00-0400",
+            ),
+        )
+        self.assertEqual(bc.invitee, invitee)
+
+    def test_link_invitees_command(self):
+        BookingCalendlyData.objects.update(invitee=None)
+        out = StringIO()
+        call_command('link_invitees', stdout=out)
+        self.assertTrue('Linked 4 booking(s)' in out.getvalue())
+        self.assertEqual(
+            BookingCalendlyData.objects.get(calendly_uuid="3").invitee,
+            Invitee.objects.get(email="a@localhost"),
+        )
+
     def test_bc_run_approval_nogroup_decline(self):
         "APPROVAL_TYPE_DECLINE"
         config.APPROVAL_NO_GROUP_ACTION = ApprovalGroup.APPROVAL_TYPE_DECLINE
@@ -321,6 +581,8 @@ class ApprovalTests(TestCase):
         bc.run_approval()
         self.assertEqual(bc.approval_group, None)
         self.assertEqual(bc.booking.approval_status, Booking.APPROVAL_STATUS_DECLINED)
+        event = ApprovalEvent.objects.get(booking=bc.booking)
+        self.assertEqual((event.group, event.old_status), (None, Booking.APPROVAL_STATUS_NEW))
 
     def test_bc_run_approval_nogroup_manual(self):
         "APPROVAL_TYPE_MANUAL"
@@ -337,3 +599,10 @@ class ApprovalTests(TestCase):
         bc.run_approval()
         self.assertEqual(bc.approval_group, None)
         self.assertEqual(bc.booking.approval_status, Booking.APPROVAL_STATUS_NEW)
+
+
+@override_settings(DATABASE_FAST_PATHS=False)
+class ApprovalFallbackTests(ApprovalTests):
+    """
+    Same approvals through the portable queries other backends get
+    """
@@ -0,0 +1,127 @@
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from constance import config
+from io import StringIO
+
+from bookings.models import Booking, ArchivedBooking
+from .models import ApprovalGroup, Invitee, BookingCalendlyData, ArchivedBookingCalendlyData, ReportChange
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        config.DEFAULT_EVENT_TYPE_ID = "2"
+        self.ag = ApprovalGroup.objects.create(name="Group 1")
+        Invitee.objects.create(email="a@localhost", group=self.ag)
+        for uuid, event_type_id, spot_start in (
+                ("1", "1", "2019-01-01 14:30:00-0400"),
+                ("2", "1", "2019-01-02 14:30:00-0400"),
+                ("3", "2", "2999-01-01 14:30:00-0400")):
+            BookingCalendlyData.objects.create(
+                calendly_uuid=uuid,
+                payload={"uuid": uuid},
+                approval_group=self.ag,
+                booking=Booking.objects.create(
+                    email="a@localhost",
+                    event_type_id=event_type_id,
+                    spot_start=spot_start,
+                    spot_end=spot_start,
+                    booked_at="2019-01-01 10:00:00-0400",
+                    approval_status=Booking.APPROVAL_STATUS_APPROVED,
+                ),
+            )
+        Booking.objects.filter(calendly_data__calendly_uuid="2").delete()
+        # cancelled bookings are archived too
+
+    def test_archive_and_restore(self):
+        booking = Booking.all_objects.get(calendly_data__calendly_uuid="2")
+        version = ReportChange.objects.latest_version()
+        moved = ArchivedBookingCalendlyData.objects.archive("1", batch_size=1)
+        self.assertEqual(moved, 2)
+        self.assertEqual(Booking.all_objects.filter(event_type_id="1").count(), 0)
+        self.assertEqual(BookingCalendlyData.objects.count(), 1)
+        self.assertTrue(ReportChange.objects.latest_version() > version)
+
+        archived = ArchivedBooking.objects.get(pk=booking.pk)
+        self.assertEqual(archived.cancelled_at, booking.cancelled_at)
+        self.assertEqual(archived.created_at, booking.created_at)
+        self.assertEqual(archived.calendly_data.calendly_uuid, "2")
+        self.assertEqual(archived.calendly_data.payload, {"uuid": "2"})
+        self.assertEqual(archived.calendly_data.approval_group_id, self.ag.pk)
+
+        self.assertEqual(ArchivedBookingCalendlyData.objects.restore("1"), 2)
+        self.assertEqual(ArchivedBooking.objects.count(), 0)
+        restored = Booking.all_objects.get(pk=booking.pk)
+        self.assertEqual(restored.created_at, booking.created_at)
+        self.assertEqual(restored.calendly_data.invitee.email, "a@localhost")
+
+    def test_restore_deleted_group(self):
+        ArchivedBookingCalendlyData.objects.archive("1")
+        BookingCalendlyData.objects.update(approval_group=None)
+        self.ag.delete()
+        ArchivedBookingCalendlyData.objects.restore("1")
+        self.assertEqual(BookingCalendlyData.objects.filter(approval_group__isnull=False).count(), 0)
+
+    def test_archive_command(self):
+        out, err = StringIO(), StringIO()
+        call_command('archive_event_type', '1', '2', stdout=out, stderr=err)
+        self.assertTrue('Archived 2 booking(s) of 1' in out.getvalue())
+        self.assertTrue('Skipped 2' in err.getvalue())
+        self.assertEqual(Booking.all_objects.count(), 1)
+
+        call_command('archive_event_type', '1', '--restore', stdout=out)
+        self.assertTrue('Restored 2 booking(s) of 1' in out.getvalue())
+
+        call_command('archive_event_type', '--finished', stdout=out)
+        self.assertEqual(list(ArchivedBooking.objects.order_by().values_list('event_type_id', flat=True).distinct()), ["1"])
+
+        with self.assertRaises(CommandError):
+            call_command('archive_event_type')
+
+
+class PayloadTests(TestCase):
+    payload = {
+        "event_type": {"uuid": "CCCC", "name": "Event Type Name", "slug": "event_type_name"},
+        "event": {"invitee_start_time": "2019-01-01T14:30:00Z", "invitee_end_time": "2019-01-01T14:40:00Z",
+            "location": "The Coffee Shop"},
+        "invitee": {"uuid": "AAAA", "email": "a@localhost", "created_at": "2019-01-01T10:00:00Z",
+            "text_reminder_number": "+14045551234"},
+        "questions_and_answers": [{"question": "Skype ID", "answer": "fake_skype_id"}],
+    }
+
+    def setUp(self):
+        BookingCalendlyData.objects.create(
+            calendly_uuid="1",
+            payload=self.payload,
+            booking=Booking.objects.create(
+                email="a@localhost",
+                event_type_id="1",
+                spot_start="2019-01-01 14:30:00-0400",
+                spot_end="2019-01-01 14:40:00-0400",
+            ),
+        )
+
+    def test_compressed(self):
+        self.assertEqual(BookingCalendlyData.objects.filter(payload={}).exclude(payload_zlib=None).count(), 1)
+        self.assertEqual(BookingCalendlyData.objects.get().payload, self.payload)
+
+    def test_compact_command(self):
+        with self.settings(CALENDLY_PAYLOAD_COMPRESSION=False):
+            out = StringIO()
+            call_command('compact_payloads', stdout=out)
+            self.assertTrue('stored 1 payload(s) anew, trimmed 0' in out.getvalue())
+            self.assertEqual(BookingCalendlyData.objects.filter(payload=self.payload, payload_zlib=None).count(), 1)
+
+        out = StringIO()
+        call_command('compact_payloads', '--retention-days', '30', stdout=out)
+        self.assertTrue('stored 1 payload(s) anew, trimmed 1' in out.getvalue())
+        bc = BookingCalendlyData.objects.get()
+        self.assertTrue(bc.payload_trimmed)
+        self.assertEqual(bc.payload, {
+            "event_type": {"uuid": "CCCC", "name": "Event Type Name"},
+            "event": {"invitee_start_time": "2019-01-01T14:30:00Z", "invitee_end_time": "2019-01-01T14:40:00Z"},
+            "invitee": {"uuid": "AAAA", "email": "a@localhost", "created_at": "2019-01-01T10:00:00Z"},
+        })
+
+        call_command('compact_payloads', '--retention-days', '30', stdout=out)
+        self.assertTrue('stored 0 payload(s) anew, trimmed 0' in out.getvalue())
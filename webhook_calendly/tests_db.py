@@ -0,0 +1,92 @@
+from django.test import SimpleTestCase, TransactionTestCase, RequestFactory
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import HttpResponse
+from unittest.mock import patch
+from io import StringIO
+
+from bookings.models import Booking
+from .replica import ReplicaRouter, ReplicaStalenessMiddleware, replica_reads, use_replica, STALE_UNTIL_SESSION_KEY
+
+
+class Session(dict):
+    session_key = 'key'
+
+
+class ReplicaTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+        @use_replica
+        def view(request):
+            return HttpResponse(self.router.db_for_read(Booking) or 'default')
+        self.view = view
+
+    def request(self, method, session, view=None):
+        request = getattr(self.factory, method)('/')
+        request.session = session
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = session.session_key
+        return ReplicaStalenessMiddleware(view or self.view)(request)
+
+    def test_router_without_replica(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Booking), None)
+
+    def test_router(self):
+        with patch.dict(settings.DATABASES, {'replica': {}}):
+            self.assertEqual(self.router.db_for_read(Booking), None)
+            with replica_reads():
+                self.assertEqual(self.router.db_for_read(Booking), 'replica')
+                self.assertEqual(self.router.db_for_read(User), None)
+                self.assertEqual(self.router.db_for_write(Booking), 'default')
+            self.assertFalse(self.router.allow_migrate('replica', 'bookings'))
+
+    def test_staleness_after_write(self):
+        session = Session()
+        with patch.dict(settings.DATABASES, {'replica': {}}):
+            self.assertEqual(self.request('get', session).content, b'replica')
+            self.assertNotIn(STALE_UNTIL_SESSION_KEY, session)
+
+            self.request('get', session, lambda request: HttpResponse(self.router.db_for_write(Booking)))
+            self.assertIn(STALE_UNTIL_SESSION_KEY, session)
+            self.assertEqual(self.request('get', session).content, b'default')
+
+    def test_staleness_after_post(self):
+        session = Session()
+        with patch.dict(settings.DATABASES, {'replica': {}}):
+            self.request('post', session)
+            self.assertEqual(self.request('get', session).content, b'default')
+
+    def test_staleness_without_session(self):
+        session = Session()
+        session.session_key = None
+        self.request('post', session)
+        self.assertNotIn(STALE_UNTIL_SESSION_KEY, session)
+
+
+class ConnectionTests(TransactionTestCase):
+    def test_benchmark_connections_command(self):
+        out = StringIO()
+        call_command('benchmark_connections', requests=2, stdout=out)
+        self.assertIn('reconnecting: ', out.getvalue())
+        self.assertIn('persistent: ', out.getvalue())
+        self.assertIn('saved by persistent connections: ', out.getvalue())
+
+
+class StartupTests(SimpleTestCase):
+    def test_benchmark_startup_command(self):
+        out = StringIO()
+        call_command('benchmark_startup', 'calendly_helper.settings_webhook', runs=1, stdout=out)
+        self.assertIn('calendly_helper.settings_webhook: ', out.getvalue())
+        self.assertIn('MB max RSS', out.getvalue())
+
+
+class WorkerTests(SimpleTestCase):
+    def test_benchmark_workers_command(self):
+        out = StringIO()
+        call_command('benchmark_workers', requests=4, concurrency=4, wait=10, workers=1, threads=2, stdout=out)
+        self.assertIn('sync (1 workers x 1 threads): ', out.getvalue())
+        self.assertIn('gthread (1 workers x 2 threads): ', out.getvalue())
+        self.assertIn('threaded workers serve ', out.getvalue())
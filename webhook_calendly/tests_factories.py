@@ -0,0 +1,57 @@
+from django.test import TestCase
+from django.db import connection
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from unittest.mock import patch
+from io import StringIO
+
+from bookings.models import Booking
+from .models import ApprovalGroup, Invitee, BookingCalendlyData, EventType
+from .factories import generate_dataset
+
+
+class GenerateDatasetTests(TestCase):
+    def test_generate_dataset(self):
+        counts = generate_dataset(groups=5, invitees_per_group=3, bookings=60, event_types=2,
+            cancelled=0.2, protected=0.2, stray=0.2, seed=1)
+        self.assertEqual(counts['groups'], 5)
+        self.assertEqual(Invitee.objects.count(), 15)
+        self.assertEqual(Booking.all_objects.count(), 60)
+        self.assertEqual(BookingCalendlyData.objects.count(), 60)
+        self.assertEqual(set(EventType.objects.values_list('event_type_id', flat=True)), set(counts['event_types']))
+
+        self.assertTrue(Booking.all_objects.exclude(cancelled_at=None).exists())
+        self.assertTrue(Booking.all_objects.filter(approval_protected=True).exists())
+        self.assertTrue(BookingCalendlyData.objects.filter(invitee=None).exists())
+        for data in BookingCalendlyData.objects.exclude(invitee=None).select_related('booking', 'invitee'):
+            self.assertEqual(data.booking.email_normalized, data.invitee.email_normalized)
+            self.assertEqual(data.payload['invitee']['email'], data.booking.email)
+
+    def test_generate_dataset_numbered(self):
+        # backends bulk_create returns no primary keys on
+        with patch.object(connection.features, 'can_return_ids_from_bulk_insert', False):
+            generate_dataset(groups=2, invitees_per_group=2, bookings=10, stray=0, seed=1)
+        self.assertEqual(Invitee.objects.filter(group__name__startswith='gen ').count(), 4)
+        for data in BookingCalendlyData.objects.select_related('booking', 'invitee'):
+            self.assertEqual(data.payload['invitee']['email'], data.booking.email)
+            self.assertEqual(data.booking.email_normalized, data.invitee.email_normalized)
+
+    def test_generate_dataset_seed(self):
+        emails = []
+        for prefix in ('a', 'b'):
+            generate_dataset(groups=2, invitees_per_group=2, bookings=10, prefix=prefix, seed=1)
+            emails.append(list(Booking.all_objects.filter(
+                email_normalized__startswith=prefix + '.').order_by('pk').values_list('email_normalized', flat=True)))
+        self.assertEqual([e[1:] for e in emails[0]], [e[1:] for e in emails[1]])
+
+    def test_generate_dataset_command(self):
+        out = StringIO()
+        call_command('generate_dataset', groups=3, invitees_per_group=2, bookings=20, event_types=1,
+            seed=1, approve=True, stdout=out)
+        self.assertIn('Inserted 3 group(s), 6 invitee(s) and 20 booking(s)', out.getvalue())
+        self.assertIn('Approved in', out.getvalue())
+        self.assertFalse(BookingCalendlyData.objects.exclude(invitee=None).filter(
+            approval_group=None, booking__approval_protected=False, booking__cancelled_at=None).exists())
+
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', groups=1, bookings=1, stdout=out)
@@ -0,0 +1,100 @@
+from django.test import TestCase, override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from bookings.models import Booking
+from .models import ApprovalGroup, Invitee, BookingCalendlyData, PendingApproval
+from . import fastpath
+
+
+class FastPathTests(TestCase):
+    def setUp(self):
+        self.ag1 = ApprovalGroup.objects.create(name="Group 1")
+        self.ag2 = ApprovalGroup.objects.create(name="Group 2")
+        Invitee.objects.create(email="a@localhost", group=self.ag1)
+        Invitee.objects.create(email="b@localhost", group=self.ag2)
+        self.bookings = []
+        for email, booked_at in (
+                ("a@localhost", "2019-01-01 10:00:00-0400"),
+                ("a@localhost", "2019-01-01 09:00:00-0400"),
+                ("a@localhost", "2019-01-01 09:00:00-0400"),
+                ("b@localhost", "2019-01-01 11:00:00-0400")):
+            b = Booking.objects.create(
+                event_type_id="1",
+                email=email,
+                spot_start="2019-01-02 14:30:00-0400",
+                spot_end="2019-01-02 14:40:00-0400",
+                booked_at=booked_at,
+            )
+            BookingCalendlyData.objects.create(calendly_uuid=str(b.pk), booking=b)
+            self.bookings.append(b)
+
+    def test_insert_ignore(self):
+        for _ in range(2):
+            fastpath.insert_ignore(PendingApproval, [
+                PendingApproval(group=self.ag1, event_type_id="1"),
+                PendingApproval(group=self.ag2, event_type_id="1"),
+            ], unique=('group', 'event_type_id'))
+        self.assertEqual(PendingApproval.objects.count(), 2)
+
+    def test_update_values(self):
+        b1, b2, b3, b4 = self.bookings
+        updated = fastpath.update_values(Booking, 'approval_status', {
+            b1.pk: Booking.APPROVAL_STATUS_APPROVED,
+            b2.pk: Booking.APPROVAL_STATUS_DECLINED,
+            b3.pk: Booking.APPROVAL_STATUS_APPROVED,
+        }, batch_size=2, updated_at="2020-01-01 12:00:00-0400")
+        self.assertEqual(updated, 3)
+        self.assertEqual(dict(Booking.objects.values_list('pk', 'approval_status')), {
+            b1.pk: Booking.APPROVAL_STATUS_APPROVED,
+            b2.pk: Booking.APPROVAL_STATUS_DECLINED,
+            b3.pk: Booking.APPROVAL_STATUS_APPROVED,
+            b4.pk: Booking.APPROVAL_STATUS_NEW,
+        })
+        self.assertEqual(Booking.objects.filter(updated_at__year=2020).count(), 3)
+
+    def test_update_values_single_statement(self):
+        if not fastpath.enabled():
+            self.skipTest('portable updates run a statement per value')
+        with CaptureQueriesContext(connection) as queries:
+            fastpath.update_values(Booking, 'approval_status', {
+                b.pk: status for b, status in zip(self.bookings, (
+                    Booking.APPROVAL_STATUS_APPROVED, Booking.APPROVAL_STATUS_DECLINED))
+            })
+        self.assertEqual(len(queries), 1)
+
+    def test_first_per_group(self):
+        b1, b2, b3, b4 = self.bookings
+        self.assertEqual(sorted(fastpath.first_per_group(
+            Booking.objects.all(), 'calendly_data__invitee__group', 'booked_at')), [b2.pk, b4.pk])
+
+    def test_rank_in_group(self):
+        b1, b2, b3, b4 = self.bookings
+        ranks = dict(fastpath.rank_in_group(
+            Booking.objects.all(), 'calendly_data__invitee__group', 'booked_at'
+            ).values_list('pk', 'group_rank'))
+        self.assertEqual(ranks, {b2.pk: 1, b3.pk: 2, b1.pk: 3, b4.pk: 1})
+
+    def test_first_in_group(self):
+        b1, b2, b3, b4 = self.bookings
+        bookings = Booking.objects.all()
+        first = fastpath.first_in_group(bookings, 'calendly_data__invitee__group', 'booked_at')
+        self.assertEqual(sorted(bookings.filter(first).values_list('pk', flat=True)), [b2.pk, b4.pk])
+        self.assertEqual(sorted(bookings.exclude(first).values_list('pk', flat=True)), [b1.pk, b3.pk])
+
+
+@override_settings(DATABASE_FAST_PATHS=False)
+class FallbackTests(FastPathTests):
+    """
+    Same operations through the portable code other backends get
+    """
+    def test_enabled(self):
+        self.assertFalse(fastpath.enabled())
+
+    def test_update_values_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            updated = fastpath.update_values(Booking, 'approval_status', {
+                b.pk: Booking.APPROVAL_STATUS_APPROVED for b in self.bookings
+            }, batch_size=3)
+        self.assertEqual(updated, 4)
+        self.assertEqual(len(queries), 2)
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client, RequestFactory
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.utils.dateparse import parse_datetime
@@ -11,7 +11,7 @@ from io import BytesIO
 from urllib.request import HTTPError
 
 from bookings.models import Booking
-from .models import BookingCalendlyData
+from .models import BookingCalendlyData, ReportChange, EventType
 from .admin import Hook, HookAdmin
 from .views.hooksmgr import get_hook_url, ListHooksView, add_hook, remove_hook
 import json
@@ -44,6 +44,11 @@ class HookAdminTests(TestCase):
         self.assertTrue(config.WEBHOOK_TOKEN in url)
         self.assertTrue('://' in url) # Absolute URL
 
+    @override_settings(WEBHOOK_BASE_URL='https://hooks.example.com/')
+    def test_get_hook_url_base(self):
+        url = get_hook_url(self.factory.get('/'))
+        self.assertEqual(url, 'https://hooks.example.com/calendly/post?token='+config.WEBHOOK_TOKEN)
+
     def test_permission(self):
         site = AdminSite()
         ma = HookAdmin(Hook, site)
@@ -167,6 +172,11 @@ class HookPostTests(TestCase):
 
         self.assertEqual(objs[0].calendly_data.calendly_uuid, 'AAAAAAAAAAAAAAAA')
         self.assertEqual(objs[0].calendly_data.payload, json.loads(self.json_create)['payload'])
+        # saved, then approved, in a single report change
+        self.assertEqual(ReportChange.objects.filter(event_type_id='CCCCCCCCCCCCCCCC').count(), 1)
+        event_type = EventType.objects.get(event_type_id='CCCCCCCCCCCCCCCC')
+        self.assertEqual(event_type.name, 'Event Type Name')
+        self.assertEqual(event_type.total, 1)
 
     def test_create_conflict(self):
         response = self.client.post(reverse('webhook_post')+'?token='+config.WEBHOOK_TOKEN, data=self.json_create, content_type='application/json')
@@ -225,7 +235,7 @@ class HookPostTests(TestCase):
         response = self.client.post(reverse('webhook_post')+'?token='+config.WEBHOOK_TOKEN, data=self.json_bad.replace('"event":"invitee.created",', ''), content_type='application/json')
         self.assertEqual(response.status_code, 400)
 
-def _hookcanceltest_urlopen(request):
+def _hookcanceltest_urlopen(request, timeout=None):
     ret = BytesIO(request.data)
     ret.status = 400
     return ret
@@ -263,3 +273,10 @@ class HookCancelTest(TestCase):
         with patch('urllib.request.urlopen', _hookcanceltest_urlopen) as urlopen:
             ret = self.bc.calendly_cancel(cancel_reason="", canceled_by=None)
             self.assertTrue('"canceled_by": "test"' in ret)
+
+
+@override_settings(ROOT_URLCONF='calendly_helper.urls_webhook')
+class WebhookOnlyPostTests(HookPostTests):
+    """
+    Same webhooks through the URLconf of settings_webhook
+    """
@@ -0,0 +1,241 @@
+from django.test import TestCase, RequestFactory
+from django.urls import reverse
+from django.contrib.auth.models import User, Permission
+from django.contrib.admin import AdminSite
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import timedelta
+from constance import config
+from unittest.mock import patch
+from io import StringIO
+
+from bookings.models import Booking
+from .models import ApprovalGroup, Invitee, BookingCalendlyData, Job, SweepWatermark
+from .admin import GroupAdmin, BookingCalendlyAdmin, JobAdmin
+from .jobs import JOBS
+
+
+def _message_user(request, message, *args, **kwargs):
+    request._test_message = message
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_superuser(
+            username='test', email='test@localhost', password='test')
+        self.site = AdminSite()
+        config.DEFAULT_EVENT_TYPE_ID = "2"
+        config.APPROVAL_USER_ID = self.user.id
+        ag = ApprovalGroup.objects.create(name="Group 1")
+        Invitee.objects.create(email="a@localhost", group=ag)
+        for uuid, booked_at in (("1", "2019-01-01 9:50:00-0400"), ("2", "2019-01-01 10:00:00-0400")):
+            BookingCalendlyData.objects.create(
+                calendly_uuid=uuid,
+                booking=Booking.objects.create(
+                    email="a@localhost",
+                    event_type_id="2",
+                    spot_start="2019-01-01 14:40:00-0400",
+                    spot_end="2019-01-01 14:50:00-0400",
+                    booked_at=booked_at,
+                ),
+            )
+
+    def _request(self):
+        request = self.factory.post('/')
+        request.user = self.user
+        setattr(request, 'session', {})
+        setattr(request, '_messages', FallbackStorage(request))
+        return request
+
+    def test_execute_approval_job(self):
+        request = self._request()
+        ma = GroupAdmin(ApprovalGroup, self.site)
+        ma.message_user = _message_user
+        ma.execute_approval_in_background(request, ApprovalGroup.objects.all())
+        self.assertTrue('Queued' in request._test_message)
+        # nothing changes within the request
+        self.assertEqual(Booking.objects.filter(approval_status=Booking.APPROVAL_STATUS_NEW).count(), 2)
+
+        out = StringIO()
+        call_command('run_jobs', stdout=out)
+        self.assertTrue('Done' in out.getvalue())
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertEqual((job.progress, job.total), (1, 1))
+        self.assertTrue('Updated 2 approval' in job.result)
+        self.assertEqual(Booking.objects.filter(approval_status=Booking.APPROVAL_STATUS_APPROVED).count(), 1)
+        self.assertEqual(Booking.objects.filter(approval_status=Booking.APPROVAL_STATUS_DECLINED).count(), 1)
+
+    def test_calendly_cancel_job(self):
+        request = self._request()
+        ma = BookingCalendlyAdmin(Booking, self.site)
+        ma.message_user = _message_user
+        ma.calendly_cancel_in_background(request, Booking.objects.all())
+        with patch.object(BookingCalendlyData, 'calendly_cancel', side_effect=[True, 'Not found']):
+            Job.objects.run_next()
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertTrue('Cancelled 1 booking(s)' in job.result)
+        self.assertTrue('Not found' in job.result)
+
+    def test_export_job(self):
+        request = self._request()
+        ma = BookingCalendlyAdmin(Booking, self.site)
+        ma.message_user = _message_user
+        ma.export_in_background(request, Booking.objects.all())
+        Job.objects.run_next()
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertEqual(job.output_name, 'booking-{}.csv'.format(job.pk))
+        self.assertEqual(job.output.count('a@localhost'), 2)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:webhook_calendly_job_download', args=(job.pk,)))
+        self.assertEqual(response.content.decode(), job.output)
+        response = self.client.get(reverse('admin:webhook_calendly_job_changelist'))
+        self.assertContains(response, job.output_name)
+
+    def test_export_download_permission(self):
+        job = Job.objects.create(name='export', user=self.user, status=Job.STATUS_DONE,
+            kwargs={'model': 'bookings.Booking'}, output='a@localhost', output_name='booking-1.csv')
+        url = reverse('admin:webhook_calendly_job_download', args=(job.pk,))
+        staff = User.objects.create_user('staff', 'staff@localhost', 'staff', is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='view_job'))
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        staff.user_permissions.add(Permission.objects.get(codename='view_booking'))
+        self.client.force_login(User.objects.get(pk=staff.pk))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_fail_stale_jobs(self):
+        job = Job.objects.enqueue('execute_approval', self.user, group_ids=[], event_type_id="2")
+        Job.objects.filter(pk=job.pk).update(status=Job.STATUS_RUNNING,
+            started_at=timezone.now() - timedelta(hours=2))
+        running = Job.objects.create(name='export', status=Job.STATUS_RUNNING, started_at=timezone.now())
+        out = StringIO()
+        call_command('run_jobs', stdout=out)
+        self.assertTrue('Marked 1 stale job(s) failed' in out.getvalue())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertIsNotNone(job.finished_at)
+        running.refresh_from_db()
+        self.assertEqual(running.status, Job.STATUS_RUNNING)
+
+    def test_export_job_batches(self):
+        pks = list(Booking.objects.values_list('pk', flat=True))
+        with self.assertNumQueries(2 + 2 * len(pks) + 1):
+            # start, a query and progress per batch (without a query per
+            # related row), then finish
+            job = Job.objects.run_now('export',
+                resource='webhook_calendly.admin.BookingCalendlyIEResource', model='bookings.Booking',
+                pks=pks, batch_size=1)
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertEqual(job.output.count('a@localhost'), 2)
+        self.assertEqual(job.progress, len(pks))
+
+    def test_benchmark_memory_command(self):
+        out = StringIO()
+        call_command('benchmark_memory', event_type_id="2", hooks=2, stdout=out)
+        for path in ('webhook', 'approval', 'reports', 'export'):
+            self.assertIn(path + ': peak ', out.getvalue())
+        self.assertEqual(Job.objects.count(), 0)
+        # rolled back
+        self.assertFalse(Booking.objects.filter(event_type_id='benchmark-memory').exists())
+
+    def test_failed_job(self):
+        job = Job.objects.enqueue('execute_approval', self.user)
+        Job.objects.run_next()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertTrue('event_type_id' in job.result)
+        self.assertEqual(Job.objects.run_next(), None)
+
+    def test_progress_display(self):
+        ma = JobAdmin(Job, self.site)
+        self.assertEqual(ma.progress_display(Job(progress=1, total=4)), '1 / 4 (25%)')
+        self.assertEqual(ma.progress_display(Job()), '-')
+        self.assertEqual(set(JOBS), set(['execute_approval', 'calendly_cancel', 'export', 'sweep_approvals']))
+
+    def test_sweep_approvals(self):
+        ag2 = ApprovalGroup.objects.create(name="Group 2")
+        out = StringIO()
+        call_command('sweep_approvals', stdout=out)
+        self.assertTrue('Swept 2 group(s), updated 2 approval' in out.getvalue())
+
+        # bookings it changed are checked once more, then nothing is left
+        call_command('sweep_approvals', stdout=out)
+        self.assertTrue('Swept 1 group(s), updated 0 approval' in out.getvalue())
+        call_command('sweep_approvals', stdout=out)
+        self.assertTrue('Swept 0 group(s)' in out.getvalue())
+
+        # a new invitee of group 2 only sweeps group 2
+        invitee = Invitee.objects.create(email="b@localhost", group=ag2)
+        job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+        self.assertTrue('Swept 1 group(s)' in job.result)
+
+        # bookings reset in the admin get approved again
+        request = self._request()
+        ma = BookingCalendlyAdmin(Booking, self.site)
+        ma.message_user = _message_user
+        ma.reset_approval(request, Booking.objects.filter(approval_status=Booking.APPROVAL_STATUS_DECLINED))
+        job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+        self.assertTrue("updated 1 approval in 2." in job.result)
+
+    def test_sweep_approvals_event_types(self):
+        for uuid, booked_at in (("3", "2019-02-01 9:50:00-0400"), ("4", "2019-02-01 10:00:00-0400")):
+            BookingCalendlyData.objects.create(
+                calendly_uuid=uuid,
+                booking=Booking.objects.create(
+                    email="a@localhost",
+                    event_type_id="3",
+                    spot_start="2019-02-01 14:40:00-0400",
+                    spot_end="2019-02-01 14:50:00-0400",
+                    booked_at=booked_at,
+                ),
+            )
+        job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+        self.assertTrue("Swept 1 group(s), updated 2 approval in 2." in job.result)
+        # the sweep of another event type does not start from that watermark
+        job = Job.objects.run_now('sweep_approvals', event_type_id="3")
+        self.assertTrue("Swept 1 group(s), updated 2 approval in 3." in job.result)
+        job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+        self.assertTrue("Swept 1 group(s), updated 0 approval in 2." in job.result)
+        job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+        self.assertTrue("Swept 0 group(s)" in job.result)
+        job = Job.objects.run_now('sweep_approvals', event_type_id="3")
+        self.assertTrue("Swept 1 group(s), updated 0 approval in 3." in job.result)
+
+    def test_sweep_approvals_invitee_left(self):
+        ag2 = ApprovalGroup.objects.create(name="Group 2")
+        for i in range(3):
+            job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+        self.assertTrue("Swept 0 group(s)" in job.result)
+
+        # the group the invitee left is swept as well
+        invitee = Invitee.objects.get(email="a@localhost")
+        invitee.group = ag2
+        invitee.save()
+        job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+        self.assertTrue("Swept 2 group(s)" in job.result)
+        for i in range(2):
+            job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+        self.assertTrue("Swept 0 group(s)" in job.result)
+
+        invitee.delete()
+        job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+        self.assertTrue("Swept 1 group(s)" in job.result)
+
+    def test_sweep_approvals_failed(self):
+        call_command('sweep_approvals', stdout=StringIO())
+        until = SweepWatermark.objects.get(event_type_id="2").until
+        with patch.object(ApprovalGroup, 'run_approval', side_effect=Exception('Boom!')):
+            ApprovalGroup.objects.get(name="Group 1").save()
+            job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+            self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertEqual(SweepWatermark.objects.get(event_type_id="2").until, until)
+        # the watermark stays, so the group is swept again
+        job = Job.objects.run_now('sweep_approvals', event_type_id="2")
+        self.assertTrue('Swept 1 group(s)' in job.result)
@@ -1,15 +1,24 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.contrib.admin import AdminSite
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
 from constance import config
 
-from bookings.models import Booking
-from .models import ApprovalGroup, Invitee, BookingCalendlyData
+from bookings.models import Booking, CancelledBooking
+from .models import ApprovalGroup, Invitee, BookingCalendlyData, ReportChange, EventType
+from .admin import BookingCalendlyAdmin
+from .views.frontend import generate_student_reports_list
 
 
 class ReportViewTests(TestCase):
     def setUp(self):
         self.client = Client()
+        cache.clear()
         ag = ApprovalGroup.objects.create(
             name="Group",
         )
@@ -99,8 +108,195 @@ class ReportViewTests(TestCase):
         response = self.client.get(reverse('student_reports'), HTTP_ACCEPT='text/plain')
         self.assertEqual(response['CONTENT-TYPE'], 'text/plain')
 
+    def test_stud_gzip(self):
+        response = self.client.get(reverse('student_reports'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get(reverse('student_reports'), HTTP_ACCEPT='text/plain', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_admin_not_gzip(self):
+        # pages with CSRF tokens are left uncompressed (BREACH)
+        client = Client()
+        client.force_login(User.objects.create_superuser('test', 'test@localhost', 'test'))
+        response = client.get(reverse('admin:index'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
     def test_admin_event_type_id(self):
         client = Client()
         client.force_login(User.objects.create_superuser('test', 'test@localhost', 'test'))
         response = client.get(reverse('admin_reports')+'?event_type_id=2')
         self.assertEqual(response.context['event_type_ids_form'].initial['event_type_id'], "2")
+
+    def test_admin_event_type_summaries(self):
+        client = Client()
+        client.force_login(User.objects.create_superuser('test', 'test@localhost', 'test'))
+        EventType.objects.filter(event_type_id="2").update(name="Second")
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('admin_reports')+'?event_type_id=2')
+        choices = dict(response.context['event_type_ids_form'].fields['event_type_id'].choices)
+        self.assertEqual(choices["2"], "Second ({}, current)".format(Booking.objects.filter(event_type_id="2").count()))
+        self.assertEqual(choices["1"], "1 ({})".format(Booking.objects.filter(event_type_id="1").count()))
+        # counts are kept by writes, reports only read them
+        self.assertEqual([q['sql'] for q in queries if not q['sql'].startswith('SELECT')
+            and ('eventtype' in q['sql'] or 'booking' in q['sql'])], [])
+
+    def get_counts(self, event_type_id):
+        return EventType.objects.filter(event_type_id=event_type_id).values_list(
+            'new_count', 'approved_count', 'declined_count', 'cancelled_count').get()
+
+    def assertCounted(self, event_type_id):
+        counts = self.get_counts(event_type_id)
+        EventType.objects.refresh(event_type_id)
+        self.assertEqual(counts, self.get_counts(event_type_id))
+
+    def test_event_type_counts(self):
+        self.assertEqual(self.get_counts("1"), (0, 1, 1, 1))
+        self.assertEqual(self.get_counts("2"), (0, 0, 2, 0))
+
+        group = ApprovalGroup.objects.create(name="Counted", approval_type=ApprovalGroup.APPROVAL_TYPE_FIRST_BOOKED)
+        Invitee.objects.create(email="counted@localhost", group=group)
+        for i, spot_start in enumerate(("2018-12-01 10:00:00-0400", "2019-02-01 10:00:00-0400")):
+            BookingCalendlyData.objects.create(
+                calendly_uuid="counted{}".format(i),
+                booking=Booking.objects.create(
+                    event_type_id="2",
+                    email="counted@localhost",
+                    spot_start=spot_start,
+                    spot_end=spot_start,
+                    booked_at="2018-11-0{} 10:00:00-0400".format(i + 1),
+                ),
+            )
+        self.assertEqual(self.get_counts("2"), (2, 0, 2, 0))
+        event_type = EventType.objects.get(event_type_id="2")
+        self.assertEqual((event_type.first_spot.month, event_type.last_spot.month), (12, 2))
+
+        # approvals move counts from status to status
+        group.run_approval("2")
+        self.assertEqual(self.get_counts("2"), (0, 1, 3, 0))
+        self.assertCounted("2")
+
+        booking = Booking.objects.get(calendly_data__calendly_uuid="counted0")
+        booking.delete()
+        self.assertEqual(self.get_counts("2"), (0, 0, 3, 1))
+        CancelledBooking.objects.get(pk=booking.pk).delete()
+        self.assertEqual(self.get_counts("2"), (0, 0, 3, 0))
+
+        booking = Booking.objects.get(calendly_data__calendly_uuid="counted1")
+        booking.event_type_id = "3"
+        booking.save()
+        self.assertEqual(self.get_counts("2"), (0, 0, 2, 0))
+        self.assertCounted("3")
+
+        # bulk updates of the admin recount
+        bookings = Booking.objects.filter(event_type_id="2")
+        bookings.update(approval_status=Booking.APPROVAL_STATUS_NEW)
+        BookingCalendlyAdmin(Booking, AdminSite()).approval_changed(None, bookings)
+        self.assertEqual(self.get_counts("2"), (2, 0, 0, 0))
+
+    def test_stud_fragment_cache_version(self):
+        config.DEFAULT_EVENT_TYPE_ID = "1"
+        groups_list, bookings_list = generate_student_reports_list("1")
+        version = groups_list[1].cache_version
+        groups_list, bookings_list = generate_student_reports_list("1")
+        self.assertEqual(groups_list[1].cache_version, version)
+
+        Booking.objects.filter(event_type_id="1").update(approval_status=Booking.APPROVAL_STATUS_NEW)
+        groups_list, bookings_list = generate_student_reports_list("1")
+        self.assertNotEqual(groups_list[1].cache_version, version)
+
+    def test_stud_first_booking(self):
+        Booking.objects.filter(event_type_id="1").update(approval_status=Booking.APPROVAL_STATUS_APPROVED)
+        groups_list, bookings_list = generate_student_reports_list("1")
+        g = groups_list[1]
+        self.assertEqual(g.first_booking.calendly_uuid, "3")
+        self.assertEqual(bookings_list, [g.first_booking])
+        self.assertEqual(groups_list[0].first_booking, None)
+
+    def test_stud_fragment_cache_refresh(self):
+        config.DEFAULT_EVENT_TYPE_ID = "1"
+        response = self.client.get(reverse('student_reports'))
+        self.assertContains(response, 'DUP BOOKING!')
+
+        Booking.objects.filter(event_type_id="1").update(approval_status=Booking.APPROVAL_STATUS_APPROVED)
+        # rendered from the snapshot of the report version, like the JSON API
+        response = self.client.get(reverse('student_reports'))
+        self.assertContains(response, 'DUP BOOKING!')
+
+        ReportChange.objects.record("1", [ApprovalGroup.objects.get(name="Group").pk])
+        response = self.client.get(reverse('student_reports'))
+        self.assertNotContains(response, 'DUP BOOKING!')
+
+    def test_changes_bad_since(self):
+        response = self.client.get(reverse('report_changes'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_changes_up_to_date(self):
+        ReportChange.objects.record("1", [ApprovalGroup.objects.get(name="Group").pk])
+        version = ReportChange.objects.latest_version()
+        response = self.client.get(reverse('report_changes'), {'since': version, 'event_type_id': "1"})
+        self.assertEqual(response.json(), {'version': version, 'reload': False, 'groups': []})
+
+    def test_changes_groups(self):
+        config.DEFAULT_EVENT_TYPE_ID = "1"
+        config.SHOW_DECLINED_COUNT_FRONTEND = True
+        ag = ApprovalGroup.objects.get(name="Group")
+        since = ReportChange.objects.latest_version()
+        ReportChange.objects.record("1", [ag.pk])
+        ReportChange.objects.record("2", [None])
+        response = self.client.get(reverse('report_changes'), {'since': since, 'event_type_id': "1"})
+        data = response.json()
+        self.assertEqual(data['version'], ReportChange.objects.latest_version())
+        self.assertFalse(data['reload'])
+        self.assertEqual(len(data['groups']), 1)
+        self.assertEqual(data['groups'][0]['id'], ag.pk)
+        self.assertTrue('data-group-id="{}"'.format(ag.pk) in data['groups'][0]['row'])
+        self.assertTrue('DUP BOOKING!' in data['groups'][0]['row'])
+        self.assertTrue('data-booking-group-id="{}"'.format(ag.pk) in data['groups'][0]['booking_row'])
+        self.assertTrue('1 invalid booking' in data['declined'])
+
+    def test_changes_invitee_moved(self):
+        config.DEFAULT_EVENT_TYPE_ID = "1"
+        ag = ApprovalGroup.objects.get(name="Group")
+        other = ApprovalGroup.objects.create(name="Other")
+        invitee = Invitee.objects.create(email="moved@localhost", group=ag)
+        since = ReportChange.objects.latest_version()
+        invitee.group = other
+        invitee.save()
+        response = self.client.get(reverse('report_changes'), {'since': since, 'event_type_id': "1"})
+        data = response.json()
+        self.assertFalse(data['reload'])
+        self.assertEqual({g['id'] for g in data['groups']}, {ag.pk, other.pk})
+
+    def test_changes_group_renamed_reload(self):
+        config.DEFAULT_EVENT_TYPE_ID = "1"
+        ag = ApprovalGroup.objects.get(name="Group")
+        since = ReportChange.objects.latest_version()
+        ag.name = "Renamed"
+        ag.save()
+        response = self.client.get(reverse('report_changes'), {'since': since, 'event_type_id': "1"})
+        self.assertTrue(response.json()['reload'])
+
+    def test_changes_trimmed_reload(self):
+        config.DEFAULT_EVENT_TYPE_ID = "1"
+        since = ReportChange.objects.latest_version()
+        ReportChange.objects.record("1", [None])
+        ReportChange.objects.record("1", [ApprovalGroup.objects.get(name="Group").pk])
+        count = ReportChange.objects.count()
+        self.assertEqual(ReportChange.objects.trim(timezone.now() + timedelta(hours=1)), count - 1)
+        # the latest change is kept, so the version never goes back
+        self.assertEqual(ReportChange.objects.oldest_version(), ReportChange.objects.latest_version() - 1)
+        response = self.client.get(reverse('report_changes'), {'since': since, 'event_type_id': "1"})
+        self.assertTrue(response.json()['reload'])
+
+    def test_changes_event_type_reload(self):
+        config.DEFAULT_EVENT_TYPE_ID = "1"
+        ReportChange.objects.record("1", [None])
+        response = self.client.get(reverse('report_changes'), {'since': 0, 'event_type_id': "2"})
+        self.assertTrue(response.json()['reload'])
+
+
+@override_settings(DATABASE_FAST_PATHS=False)
+class ReportViewFallbackTests(ReportViewTests):
+    """
+    Same reports through the portable queries other backends get
+    """
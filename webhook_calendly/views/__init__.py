@@ -1,2 +0,0 @@
-from . import hook
-from . import hooksmgr
@@ -0,0 +1,102 @@
+from django.http import HttpRequest, JsonResponse, HttpResponseBadRequest
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+from django.conf import settings
+from datetime import datetime
+import base64
+import json
+
+from ..replica import use_replica
+from .frontend import get_report_snapshot, natural_key
+
+
+GROUP_FIELDS = ('id', 'name', 'spot_start', 'spot_end', 'dup_booking')
+BOOKING_FIELDS = ('group_id', 'group', 'spot_start', 'spot_end')
+
+
+def encode_cursor(name, pk):
+    return base64.urlsafe_b64encode(json.dumps({'after': name, 'id': pk}).encode()).decode()
+
+
+def decode_cursor(cursor):
+    '''
+    @return (name, id) of the last item of the previous page
+    '''
+    after = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    return after['after'], int(after['id'])
+
+
+def get_fields(request, allowed_fields):
+    if not request.GET.get('fields'):
+        return allowed_fields
+    fields = request.GET['fields'].split(',')
+    if not set(fields) <= set(allowed_fields):
+        raise ValueError('fields can only include '+', '.join(allowed_fields))
+    return fields
+
+
+def paginate(request, items, sort_name, sort_id):
+    '''
+    Cursor pagination over items naturally sorted by sort_name, then by
+    sort_id for names sorting the same, so pages stay stable while groups
+    come and go
+    '''
+    try:
+        limit = min(int(request.GET.get('limit', settings.API_PAGE_SIZE)), settings.API_MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError('limit is invalid')
+    if limit <= 0:
+        raise ValueError('limit is invalid')
+
+    if request.GET.get('cursor'):
+        try:
+            name, pk = decode_cursor(request.GET['cursor'])
+            after = (natural_key(name), pk)
+        except Exception:
+            raise ValueError('cursor is invalid')
+        items = [i for i in items if (natural_key(i[sort_name]), i[sort_id]) > after]
+
+    page = items[:limit]
+    next_cursor = encode_cursor(page[-1][sort_name], page[-1][sort_id]) if len(items) > limit else None
+    return page, next_cursor
+
+
+def to_json(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def api_response(request, name, sort_name, sort_id, allowed_fields):
+    snapshot = get_report_snapshot()
+    try:
+        fields = get_fields(request, allowed_fields)
+        page, next_cursor = paginate(request, snapshot[name], sort_name, sort_id)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    next_url = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        next_url = request.build_absolute_uri(request.path+'?'+query.urlencode())
+
+    return JsonResponse({
+        'version': snapshot['version'],
+        'event_type_id': snapshot['event_type_id'],
+        'declined_bookings_count': snapshot['declined_bookings_count'],
+        'results': [{f: to_json(i[f]) for f in fields} for i in page],
+        'next': next_url,
+    })
+
+
+@require_GET
+@gzip_page
+@use_replica
+def groups(request: HttpRequest):
+    return api_response(request, 'groups', 'name', 'id', GROUP_FIELDS)
+
+
+@require_GET
+@gzip_page
+@use_replica
+def bookings(request: HttpRequest):
+    return api_response(request, 'bookings', 'group', 'group_id', BOOKING_FIELDS)
@@ -1,55 +1,73 @@
 from django.shortcuts import render
-from django.http import HttpRequest, HttpResponse
-from django.db.models import Count, Prefetch, F, Subquery, OuterRef
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.db.models import Prefetch, F, Q, Subquery, OuterRef, Case, When, Value, BooleanField
+from django.template.loader import render_to_string
+from django.views.decorators.gzip import gzip_page
+from django.core.cache import cache
 from bookings.models import Booking
-from ..models import ApprovalGroup, BookingCalendlyData
+from ..models import ApprovalGroup, BookingCalendlyData, ReportChange, EventType
+from .. import fastpath
+from ..replica import use_replica
 import re
+import hashlib
 from constance import config
+from django.conf import settings
 from django.utils.html import strip_tags
 from django.contrib.admin.views.decorators import staff_member_required
 from django import forms
 
 
-def generate_student_reports_list(event_type_id):
+def generate_student_reports_list(event_type_id, group_ids=None):
     '''
-    Please be aware that the first group is the non-group
+    Please be aware that the first group is the non-group,
+    unless group_ids is given to only generate those groups
     '''
     BCD_obj = BookingCalendlyData.objects.filter(
             booking__event_type_id=event_type_id,
             booking__cancelled_at=None
-        )
+        ).select_related('booking').defer('payload', 'payload_zlib')
+    # payloads are never shown, and take most of the memory of a row
+
+    approved = BCD_obj.filter(booking__approval_status=Booking.APPROVAL_STATUS_APPROVED)
+    first_approved = fastpath.first_in_group(approved, 'approval_group', 'booking__booked_at') & Q(
+        booking__approval_status=Booking.APPROVAL_STATUS_APPROVED)
 
     groups_list = ApprovalGroup.objects.filter(
         approval_type=ApprovalGroup.APPROVAL_TYPE_FIRST_BOOKED
     ).prefetch_related(
         Prefetch('bookingcalendlydata_set',
             to_attr='current_bookings',
-            queryset=BCD_obj.order_by('booking__booked_at')
+            queryset=BCD_obj.annotate(first_approved=Case(
+                When(first_approved, then=Value(True)),
+                default=Value(False), output_field=BooleanField(),
+            )).order_by('booking__booked_at')
         )
     ).prefetch_related('invitee_set')
+    if group_ids is not None:
+        groups_list = groups_list.filter(pk__in=group_ids)
 
     # Execute
     groups_list = list(groups_list)
 
     # Append non-group result
-    non_group = ApprovalGroup(name='')
-    non_group.current_bookings = list(
-        BCD_obj.filter(approval_group=None).order_by('booking__booked_at')
-    )
-    non_group.approval_type = config.APPROVAL_NO_GROUP_ACTION
-    non_group.is_non_group = True
-    groups_list.append(non_group)
+    if group_ids is None:
+        non_group = ApprovalGroup(name='')
+        non_group.current_bookings = list(
+            BCD_obj.filter(approval_group=None).order_by('booking__booked_at')
+        )
+        non_group.approval_type = config.APPROVAL_NO_GROUP_ACTION
+        non_group.is_non_group = True
+        groups_list.append(non_group)
 
     bookings_list = []
 
     for g in groups_list:
-        # find first approved spot
-        # g.current_bookings is booked_at asc
+        # the first approved spot is ranked in SQL, the non-group has none
         g.first_booking = None
         g.approval_statuses = {slug: [] for slug, name in Booking.APPROVAL_STATUS_CHOICES}
         for b in g.current_bookings:
             g.approval_statuses[b.booking.approval_status].append(b)
-            if g.name and not g.first_booking and (b.booking.approval_status == Booking.APPROVAL_STATUS_APPROVED):
+            if g.name and b.first_approved:
                 g.first_booking = b
 
         if g.first_booking:
@@ -57,17 +75,106 @@ def generate_student_reports_list(event_type_id):
             bookings_list.append(g.first_booking)
 
         g.declined_bookings_count = len(g.approval_statuses[Booking.APPROVAL_STATUS_DECLINED])
+        g.cache_version = get_group_cache_version(g)
 
-    def natural_sort(l):
-        convert = lambda text: int(text) if text.isdigit() else text.lower()
-        alphanum_key = lambda key: [ convert(c) for c in re.split('([0-9]+)', key.name) ]
-        l.sort(key = alphanum_key)
-
-    natural_sort(groups_list)
+    groups_list.sort(key=lambda g: natural_key(g.name))
 
     return groups_list, bookings_list
 
 
+def natural_key(name):
+    convert = lambda text: int(text) if text.isdigit() else text.lower()
+    return [ convert(c) for c in re.split('([0-9]+)', name) ]
+
+
+def get_group_cache_version(group):
+    '''
+    Digest of everything a group renders in the reports, so cached fragments
+    are keyed on the group's last change without explicit invalidation
+    '''
+    h = hashlib.md5(str(group.id).encode())
+    h.update(group.name.encode())
+    for invitee in group.invitee_set.all():
+        h.update(invitee.email.encode())
+    for b in group.current_bookings:
+        h.update('|{}|{}|{}|{}|{}|{}|{}'.format(
+            b.calendly_uuid, b.booking.id, b.booking.email, b.booking.approval_status,
+            b.booking.spot_start.isoformat(), b.booking.spot_end.isoformat(),
+            b.booking.booked_at.isoformat()
+        ).encode())
+    return h.hexdigest()
+
+
+def get_declined_bookings_count(event_type_id):
+    '''
+    Same as summing declined_bookings_count of generate_student_reports_list
+    '''
+    return BookingCalendlyData.objects.filter(
+        Q(approval_group=None) | Q(approval_group__approval_type=ApprovalGroup.APPROVAL_TYPE_FIRST_BOOKED),
+        booking__event_type_id=event_type_id,
+        booking__cancelled_at=None,
+        booking__approval_status=Booking.APPROVAL_STATUS_DECLINED,
+    ).count()
+
+
+def get_group_row(g):
+    '''
+    What the student report and the JSON API show of a group
+    '''
+    return {
+        'id': g.id,
+        'name': g.name,
+        'spot_start': g.first_booking.booking.spot_start if g.first_booking else None,
+        'spot_end': g.first_booking.booking.spot_end if g.first_booking else None,
+        'dup_booking': g.declined_bookings_count > 0,
+        'cache_version': g.cache_version,
+    }
+
+
+def get_booking_row(b):
+    return {
+        'group_id': b.approval_group.id,
+        'group': b.approval_group.name,
+        'spot_start': b.booking.spot_start,
+        'spot_end': b.booking.spot_end,
+        'cache_version': b.approval_group.cache_version,
+    }
+
+
+def get_report_snapshot():
+    '''
+    Public student report data, cached per report version, rows are sorted
+    naturally by group name, then by group id
+    '''
+    version = ReportChange.objects.latest_version()
+    event_type_id = get_default_event_type_id()
+    key = 'report_snapshot:{}:{}'.format(event_type_id, version)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    groups_list = []
+    bookings_list = []
+    if event_type_id:
+        groups_list, bookings_list = generate_student_reports_list(event_type_id)
+
+    declined_bookings_count = 0
+    if config.SHOW_DECLINED_COUNT_FRONTEND:
+        declined_bookings_count = sum(map(lambda g: g.declined_bookings_count, groups_list))
+
+    snapshot = {
+        'version': version,
+        'event_type_id': event_type_id,
+        'declined_bookings_count': declined_bookings_count,
+        'groups': sorted([get_group_row(g) for g in groups_list[1:]], # except non-group
+            key=lambda g: (natural_key(g['name']), g['id'])),
+        'bookings': sorted([get_booking_row(b) for b in bookings_list],
+            key=lambda b: (natural_key(b['group']), b['group_id'])),
+    }
+    cache.set(key, snapshot, settings.REPORT_SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
+
+
 def get_default_event_type_id():
     event_type_id = None
     if config.DEFAULT_EVENT_TYPE_ID:
@@ -80,24 +187,20 @@ def get_default_event_type_id():
     return event_type_id
 
 
+@gzip_page
+@use_replica
 def student_reports(request: HttpRequest):
-    event_type_id = get_default_event_type_id()
-    declined_bookings_count = 0
-    groups_list = []
-    bookings_list = []
-
-    if event_type_id:
-        groups_list, bookings_list = generate_student_reports_list(event_type_id)
-
-        # This includes non-group number
-        if config.SHOW_DECLINED_COUNT_FRONTEND:
-            declined_bookings_count = sum(map(lambda g: g.declined_bookings_count, groups_list))
+    snapshot = get_report_snapshot()
 
     context = {
         'announcement': config.ANNOUNCEMENT,
-        'declined_bookings_count': declined_bookings_count,
-        'groups_list': groups_list[1:], # except non-group
-        'bookings_list': bookings_list,
+        'declined_bookings_count': snapshot['declined_bookings_count'],
+        'groups_list': snapshot['groups'],
+        'bookings_list': snapshot['bookings'],
+        'fragment_cache_timeout': settings.REPORT_FRAGMENT_CACHE_TIMEOUT,
+        'event_type_id': snapshot['event_type_id'] or '',
+        'report_version': snapshot['version'],
+        'report_poll_interval': config.REPORT_POLL_INTERVAL,
     }
 
     if 'text/plain' in str(request.META.get('HTTP_ACCEPT')) or request.GET.get('geek'):
@@ -107,18 +210,74 @@ def student_reports(request: HttpRequest):
         return render(request, 'bookings/student_reports.html', context)
 
 
+@gzip_page
+@use_replica
+def report_changes(request: HttpRequest):
+    '''
+    Rows of the student report changed since the given report version
+    '''
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest('since is required')
+
+    version = ReportChange.objects.latest_version()
+    data = {'version': version, 'reload': False, 'groups': []}
+    if since >= version:
+        return JsonResponse(data)
+
+    event_type_id = get_default_event_type_id()
+    if (request.GET.get('event_type_id', '') != (event_type_id or '')
+            or since < ReportChange.objects.oldest_version()):
+        data['reload'] = True
+        return JsonResponse(data)
+
+    # membership changes of any event type are recorded under '', without a
+    # group when a group itself changed, which may touch every row
+    changes = set(ReportChange.objects.filter(
+        id__gt=since, id__lte=version, event_type_id__in=(event_type_id, '')
+    ).values_list('event_type_id', 'group').distinct())
+    group_ids = {group_id for _, group_id in changes}
+    if ('', None) in changes or len(group_ids) > settings.REPORT_CHANGES_MAX_GROUPS:
+        data['reload'] = True
+        return JsonResponse(data)
+    if not group_ids:
+        return JsonResponse(data)
+
+    groups_list, bookings_list = generate_student_reports_list(event_type_id, group_ids - {None})
+    groups = {g.id: g for g in groups_list}
+    for group_id in group_ids - {None}:
+        g = groups.get(group_id)
+        context = {'fragment_cache_timeout': settings.REPORT_FRAGMENT_CACHE_TIMEOUT,
+            'g': get_group_row(g) if g else None}
+        data['groups'].append({
+            'id': group_id,
+            'row': render_to_string('bookings/student_reports_group_row.html', context) if g else '',
+            'booking_row': render_to_string('bookings/student_reports_booking_row.html',
+                dict(context, b=get_booking_row(g.first_booking))) if g and g.first_booking else '',
+        })
+
+    declined_bookings_count = 0
+    if config.SHOW_DECLINED_COUNT_FRONTEND:
+        declined_bookings_count = get_declined_bookings_count(event_type_id)
+    data['declined'] = render_to_string('bookings/student_reports_declined.html',
+        {'declined_bookings_count': declined_bookings_count})
+    return JsonResponse(data)
+
+
 @staff_member_required
+@use_replica
 def admin_reports(request: HttpRequest):
     event_type_id = get_default_event_type_id()
     if 'event_type_id' in request.GET:
         event_type_id = request.GET['event_type_id']
 
-    event_type_ids = Booking.objects.order_by().values('event_type_id').annotate(total=Count('id'))
+    event_type_ids = EventType.objects.all()
     event_type_ids_choices = [
-        (et['event_type_id'], "{} ({}{})".format(
-            et['event_type_id'], et['total'], ', current' if et['event_type_id'] == event_type_id else ''
+        (et.event_type_id, "{} ({}{})".format(
+            et, et.total, ', current' if et.event_type_id == event_type_id else ''
         ))
-        for et in event_type_ids
+        for et in event_type_ids if et.total or et.event_type_id == event_type_id
     ]
 
     class EventTypeIdForm(forms.Form):
@@ -140,5 +299,6 @@ def admin_reports(request: HttpRequest):
         'event_type_ids_form': form,
         'groups_list': groups_list,
         'bookings_list': bookings_list,
+        'fragment_cache_timeout': settings.REPORT_FRAGMENT_CACHE_TIMEOUT,
     }
     return render(request, 'bookings/admin_reports.html', context)
\ No newline at end of file
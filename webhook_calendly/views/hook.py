@@ -7,11 +7,13 @@ import json
 from django.views.decorators.csrf import csrf_exempt
 
 from bookings.models import Booking
-from ..models import BookingCalendlyData
+from ..models import BookingCalendlyData, ReportChange, EventType
 
 
 @require_POST
 @csrf_exempt
+# saving, approving and cancelling a booking adds its report changes once
+@ReportChange.objects.collect()
 def webhook_post(request: HttpRequest):
     try:
         assert request.GET['token'] == config.WEBHOOK_TOKEN
@@ -66,5 +68,13 @@ def webhook_post(request: HttpRequest):
         obj.booking.delete() # cancel
     # run approval
     obj.run_approval()
+    # notify report listeners, approval_group may have been set by the approval
+    ReportChange.objects.record(obj.booking.event_type_id, [
+        BookingCalendlyData.objects.filter(pk=obj.pk).values_list('approval_group', flat=True).get()
+    ])
+    # counts moved along with the booking, the name comes from Calendly
+    name = payload.get('event_type', {}).get('name')
+    if name:
+        EventType.objects.filter(event_type_id=obj.booking.event_type_id).exclude(name=name).update(name=name)
 
     return HttpResponse('OK')
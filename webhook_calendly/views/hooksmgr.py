@@ -6,6 +6,7 @@ from django.urls import reverse
 from django.contrib.auth.decorators import user_passes_test
 from django.utils.decorators import method_decorator
 from django.contrib.auth import REDIRECT_FIELD_NAME
+from django.conf import settings
 from constance import config
 import json
 import urllib.request
@@ -35,7 +36,11 @@ def superuser_required(view_func=None, redirect_field_name=REDIRECT_FIELD_NAME,
 
 
 def get_hook_url(request):
-    return request.build_absolute_uri(reverse('webhook_post')+'?token='+config.WEBHOOK_TOKEN)
+    url = reverse('webhook_post')+'?token='+config.WEBHOOK_TOKEN
+    if settings.WEBHOOK_BASE_URL:
+        # webhooks served by a separate, slim app
+        return settings.WEBHOOK_BASE_URL.rstrip('/') + url
+    return request.build_absolute_uri(url)
 
 
 @method_decorator(superuser_required, name='dispatch')
@@ -53,7 +58,7 @@ class ListHooksView(generic.ListView):
     def get_queryset(self):
         req = urllib.request.Request(url='https://calendly.com/api/v1/hooks',
             headers={'X-TOKEN':config.CALENDLY_WEBHOOK_TOKEN})
-        with urllib.request.urlopen(req) as f:
+        with urllib.request.urlopen(req, timeout=settings.CALENDLY_API_TIMEOUT) as f:
             text = f.read().decode()
             j = json.loads(text)
             if j['data']:
@@ -80,7 +85,7 @@ def remove_hook(request: HttpRequest, id: int):
         return HttpResponseBadRequest('Please set up token first!')
     req = urllib.request.Request(url='https://calendly.com/api/v1/hooks/'+str(id),
         headers={'X-TOKEN':config.CALENDLY_WEBHOOK_TOKEN}, method='DELETE')
-    with urllib.request.urlopen(req) as f:
+    with urllib.request.urlopen(req, timeout=settings.CALENDLY_API_TIMEOUT) as f:
         if f.status == 200:
             return HttpResponseRedirect(reverse('list_hooks'))
         else:
@@ -97,7 +102,7 @@ def add_hook(request: HttpRequest):
         data=post_data.encode(),
         headers={'X-TOKEN':config.CALENDLY_WEBHOOK_TOKEN}, method='POST')
     try:
-        f = urllib.request.urlopen(req)
+        f = urllib.request.urlopen(req, timeout=settings.CALENDLY_API_TIMEOUT)
         if f.status == 201:
             return HttpResponseRedirect(reverse('list_hooks'))
         else: